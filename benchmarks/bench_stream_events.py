@@ -0,0 +1,153 @@
+"""
+Micro-benchmark: StreamEvent / SiteResult construction and encoding.
+
+Replays the per-site work of one search (build a SiteResult, turn it into
+event data, wrap it in a StreamEvent, encode it) with the original
+dataclass path (asdict deep copy, serialize_enum_dict walk, json.dumps,
+datetime per timestamp) and with the current slotted classes.
+
+    python -m benchmarks.bench_stream_events [--events 1400] [--rounds 20]
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.username_event_codec import encode_events  # noqa: E402
+from services.username_service import CheckStatus, EventType, SiteResult, StreamEvent  # noqa: E402
+
+
+def legacy_serialize_enum_dict(data):
+    if isinstance(data, dict):
+        return {key: legacy_serialize_enum_dict(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [legacy_serialize_enum_dict(item) for item in data]
+    elif isinstance(data, Enum):
+        return data.value
+    return data
+
+
+@dataclass
+class LegacyStreamEvent:
+    event_type: EventType
+    data: dict
+    timestamp: str = None
+
+    def __post_init__(self):
+        if not self.timestamp:
+            self.timestamp = datetime.now(timezone.utc).isoformat()
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["event_type"] = self.event_type.value
+        d["data"] = legacy_serialize_enum_dict(d["data"])
+        return d
+
+    def to_sse(self) -> str:
+        return f"data: {json.dumps(self.to_dict())}\n\n"
+
+
+@dataclass
+class LegacySiteResult:
+    site_name: str
+    category: str
+    url: str
+    status: CheckStatus
+    status_code: Optional[int] = None
+    profile_data: Optional[dict] = None
+    error_message: Optional[str] = None
+    response_time: Optional[float] = None
+    checked_at: Optional[str] = None
+    cached: bool = False
+
+    def __post_init__(self):
+        if not self.checked_at:
+            self.checked_at = datetime.utcnow().isoformat()
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["status"] = self.status.value
+        return data
+
+
+def site_events(result_cls, event_cls, count: int) -> list:
+    """SITE_CHECKING + SITE_RESULT with progress for count / 2 sites"""
+    events = []
+    for i in range(count // 2):
+        events.append(event_cls(
+            event_type=EventType.SITE_CHECKING,
+            data={"site_name": f"site{i}", "category": "social", "url": f"https://example{i}.com/user/benchuser"}
+        ))
+        result = result_cls(
+            site_name=f"site{i}",
+            category="social",
+            url=f"https://example{i}.com/user/benchuser",
+            status=CheckStatus.FOUND if i % 10 == 0 else CheckStatus.NOT_FOUND,
+            status_code=200 if i % 10 == 0 else 404,
+            response_time=0.123,
+        )
+        data = result.to_dict()
+        data["progress"] = {
+            "checked": i + 1, "total": count // 2, "found": i // 10,
+            "not_found": i - i // 10, "errors": 0, "percentage": round((i + 1) / (count // 2) * 100, 2)
+        }
+        events.append(event_cls(event_type=EventType.SITE_RESULT, data=data))
+    return events
+
+
+def bench(name: str, run, count: int, rounds: int) -> float:
+    run()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        run()
+    elapsed = time.perf_counter() - start
+    rate = count * rounds / elapsed
+    print(f"{name:<26} {rate:12,.0f} events/s   {elapsed / (count * rounds) * 1e6:7.2f} us/event")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1400)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    count = args.events
+    print(f"{count} events per search, {args.rounds} rounds")
+
+    legacy = bench(
+        "legacy build + SSE",
+        lambda: "".join(e.to_sse() for e in site_events(LegacySiteResult, LegacyStreamEvent, count)),
+        count, args.rounds
+    )
+    current = bench(
+        "slotted build + SSE",
+        lambda: "".join(e.to_sse() for e in site_events(SiteResult, StreamEvent, count)),
+        count, args.rounds
+    )
+    bench(
+        "slotted build + WS frame",
+        lambda: encode_events(site_events(SiteResult, StreamEvent, count)),
+        count, args.rounds
+    )
+    bench(
+        "build only (legacy)",
+        lambda: site_events(LegacySiteResult, LegacyStreamEvent, count),
+        count, args.rounds
+    )
+    bench(
+        "build only (slotted)",
+        lambda: site_events(SiteResult, StreamEvent, count),
+        count, args.rounds
+    )
+    print(f"SSE path speedup vs legacy: {current / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
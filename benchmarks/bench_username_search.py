@@ -0,0 +1,328 @@
+"""
+End-to-end benchmark: StreamingUsernameSearchService against local mock sites.
+
+Starts an aiohttp server that emulates N synthetic WMN sites, writes a
+matching metadata snapshot to a temporary directory and runs stream_search
+against it, encoding every batch to SSE exactly like the route does. Nothing
+leaves the machine.
+
+    python -m benchmarks.bench_username_search [--sites 500] [--hosts 32] [--rounds 3]
+
+Each site gets a latency drawn from --latency-ms (uniform min,max), a body of
+--body-kb, and a role: FOUND (--found-ratio), rate-limited with a 429 and
+Retry-After (--ratelimit-ratio), hanging past the timeout (--timeout-ratio),
+or NOT_FOUND. Sites are spread across 127.0.0.x loopback addresses so the
+per-host connection limit behaves like it does against real hosts (Linux
+routes the whole 127/8 block to loopback; use --hosts 1 elsewhere).
+
+Reports throughput, per-site latency p50/p95/p99, time to first FOUND, SSE
+bytes, peak RSS and event-loop lag. --json writes the summary; with
+--baseline the run fails (exit 1) if wall time, p95 or loop lag regress by
+more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.site_latency_profile import SiteLatencyProfile  # noqa: E402
+from services.username_service import (  # noqa: E402
+    CheckStatus,
+    EventType,
+    RateLimiter,
+    StreamingUsernameSearchService,
+)
+from services.wmn_metadata_store import WMNMetadataStore  # noqa: E402
+
+USERNAME = "benchuser"
+FOUND_MARKER = "Profile of benchuser"
+MISSING_MARKER = "This page does not exist"
+
+# Metrics where a larger value is worse, compared against --baseline
+GATED_METRICS = ("wall_seconds", "latency_p95", "loop_lag_p99_ms")
+
+
+class MockSites:
+    """Synthetic WMN sites served from one aiohttp app"""
+
+    def __init__(self, count: int, hosts: int, port: int, seed: int,
+                 latency_ms: tuple, body_kb: int, found_ratio: float,
+                 ratelimit_ratio: float, timeout_ratio: float, timeout_seconds: float):
+        rng = random.Random(seed)
+        self.port = port
+        self.addresses = [f"127.0.0.{i + 1}" for i in range(hosts)]
+        self.timeout_seconds = timeout_seconds
+        self.filler = ("lorem ipsum dolor sit amet " * (body_kb * 40))[:body_kb * 1024]
+        self.sites = []
+        for i in range(count):
+            roll = rng.random()
+            if roll < timeout_ratio:
+                role = "timeout"
+            elif roll < timeout_ratio + ratelimit_ratio:
+                role = "ratelimit"
+            elif roll < timeout_ratio + ratelimit_ratio + found_ratio:
+                role = "found"
+            else:
+                role = "missing"
+            self.sites.append({
+                "name": f"bench{i}",
+                "role": role,
+                "latency": rng.uniform(*latency_ms) / 1000,
+                "host": self.addresses[i % hosts],
+            })
+        self.requests = 0
+        self._runner = None
+
+    def wmn_data(self) -> dict:
+        return {
+            "sites": [
+                {
+                    "name": site["name"],
+                    "cat": "bench",
+                    "uri_check": f"http://{site['host']}:{self.port}/{i}/{{account}}",
+                    "e_code": 200,
+                    "e_string": FOUND_MARKER,
+                    "m_code": 404,
+                    "m_string": MISSING_MARKER,
+                }
+                for i, site in enumerate(self.sites)
+            ]
+        }
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        site = self.sites[int(request.match_info["index"])]
+        role = site["role"]
+        if role == "timeout":
+            await asyncio.sleep(self.timeout_seconds + 1)
+        else:
+            await asyncio.sleep(site["latency"])
+
+        if role == "ratelimit":
+            return web.Response(status=429, text="Too Many Requests", headers={"Retry-After": "1"})
+        if role == "found":
+            return web.Response(text=f"<title>{FOUND_MARKER}</title>{self.filler}")
+        return web.Response(status=404, text=f"{self.filler}{MISSING_MARKER}")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{index}/{account}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        for address in self.addresses:
+            await web.TCPSite(self._runner, address, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class LoopLagMonitor:
+    """Measures how late a fixed-interval sleep wakes up"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_round(service: StreamingUsernameSearchService) -> dict:
+    monitor = LoopLagMonitor()
+    latencies = []
+    statuses = {}
+    first_found = None
+    sse_bytes = 0
+    frames = 0
+
+    monitor.start()
+    start = time.perf_counter()
+    async for batch in service.stream_search_batches(username=USERNAME):
+        frame = "".join(event.to_sse() for event in batch)
+        sse_bytes += len(frame)
+        frames += 1
+        for event in batch:
+            if event.event_type != EventType.SITE_RESULT:
+                continue
+            status = event.data["status"]
+            statuses[status] = statuses.get(status, 0) + 1
+            if event.data.get("response_time") is not None:
+                latencies.append(event.data["response_time"])
+            if first_found is None and status == CheckStatus.FOUND.value:
+                first_found = time.perf_counter() - start
+    wall = time.perf_counter() - start
+    await monitor.stop()
+
+    checked = sum(statuses.values())
+    return {
+        "wall_seconds": round(wall, 3),
+        "sites_per_second": round(checked / wall, 1) if wall else 0.0,
+        "first_found_seconds": round(first_found, 3) if first_found is not None else None,
+        "latency_p50": round(percentile(latencies, 0.50), 3),
+        "latency_p95": round(percentile(latencies, 0.95), 3),
+        "latency_p99": round(percentile(latencies, 0.99), 3),
+        "loop_lag_p99_ms": round(percentile(monitor.samples, 0.99) * 1000, 2),
+        "loop_lag_max_ms": round(max(monitor.samples, default=0.0) * 1000, 2),
+        "sse_frames": frames,
+        "sse_bytes": sse_bytes,
+        "statuses": statuses,
+    }
+
+
+async def run(args) -> dict:
+    logging.disable(logging.WARNING)
+    mock = MockSites(
+        count=args.sites,
+        hosts=args.hosts,
+        port=args.port,
+        seed=args.seed,
+        latency_ms=tuple(args.latency_ms),
+        body_kb=args.body_kb,
+        found_ratio=args.found_ratio,
+        ratelimit_ratio=args.ratelimit_ratio,
+        timeout_ratio=args.timeout_ratio,
+        timeout_seconds=args.timeout,
+    )
+    await mock.start()
+
+    with tempfile.TemporaryDirectory(prefix="bench-username-") as workdir:
+        snapshot_path = Path(workdir) / "wmn-data.json"
+        snapshot_path.write_text(json.dumps(mock.wmn_data()))
+        service = StreamingUsernameSearchService(
+            max_concurrent_requests=args.concurrency,
+            timeout_seconds=args.timeout,
+            metadata_store=WMNMetadataStore(url="http://127.0.0.1:9/unused", snapshot_path=snapshot_path),
+            rate_limiter=RateLimiter(rate=args.rate, burst=args.burst),
+            latency_profile=SiteLatencyProfile(path=Path(workdir) / "site_latency.json"),
+        )
+
+        rounds = []
+        try:
+            for round_index in range(args.rounds):
+                result = await run_round(service)
+                rounds.append(result)
+                print(
+                    f"round {round_index + 1}: {result['wall_seconds']:6.2f} s  "
+                    f"{result['sites_per_second']:7.1f} sites/s  "
+                    f"p50/p95/p99 {result['latency_p50']:.3f}/{result['latency_p95']:.3f}/{result['latency_p99']:.3f} s  "
+                    f"first FOUND {result['first_found_seconds']} s  "
+                    f"loop lag p99 {result['loop_lag_p99_ms']} ms  "
+                    f"{result['sse_frames']} frames"
+                )
+        finally:
+            await mock.stop()
+
+    # The first round has no latency history; report the median of the rest
+    steady = rounds[1:] or rounds
+    summary = {
+        key: round(statistics.median(r[key] for r in steady), 3)
+        for key in ("wall_seconds", "sites_per_second", "latency_p50", "latency_p95",
+                    "latency_p99", "loop_lag_p99_ms", "loop_lag_max_ms", "sse_frames")
+    }
+    summary["first_found_seconds"] = round(statistics.median(
+        [r["first_found_seconds"] for r in steady if r["first_found_seconds"] is not None] or [0.0]
+    ), 3)
+    summary["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    summary["requests_served"] = mock.requests
+    summary["statuses"] = steady[-1]["statuses"]
+    summary["config"] = {
+        "sites": args.sites,
+        "hosts": args.hosts,
+        "latency_ms": args.latency_ms,
+        "body_kb": args.body_kb,
+        "found_ratio": args.found_ratio,
+        "ratelimit_ratio": args.ratelimit_ratio,
+        "timeout_ratio": args.timeout_ratio,
+        "timeout": args.timeout,
+        "concurrency": args.concurrency,
+    }
+    return summary
+
+
+def check_baseline(summary: dict, baseline_path: Path, tolerance: float) -> bool:
+    baseline = json.loads(baseline_path.read_text())
+    ok = True
+    for key in GATED_METRICS:
+        before, after = baseline.get(key), summary.get(key)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        verdict = "REGRESSION" if change > tolerance else "ok"
+        if change > tolerance:
+            ok = False
+        print(f"{key:<18} {before:>9} -> {after:<9} {change:+.1%}  {verdict}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--hosts", type=int, default=32, help="Loopback addresses to spread sites over")
+    parser.add_argument("--port", type=int, default=18765)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=[20, 400], metavar=("MIN", "MAX"))
+    parser.add_argument("--body-kb", type=int, default=32)
+    parser.add_argument("--found-ratio", type=float, default=0.1)
+    parser.add_argument("--ratelimit-ratio", type=float, default=0.02)
+    parser.add_argument("--timeout-ratio", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=2.0, help="Service per-request timeout in seconds")
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=50.0, help="Per-host requests per second")
+    parser.add_argument("--burst", type=float, default=50.0)
+    parser.add_argument("--json", type=Path, help="Write the summary to this file")
+    parser.add_argument("--baseline", type=Path, help="Summary JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(json.dumps({k: v for k, v in summary.items() if k != "config"}, indent=2))
+
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2))
+    if args.baseline and not check_baseline(summary, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Micro-benchmark: WMN e_string/m_string detection.
+
+Compares the original per-pattern path (literal `in`, then an IGNORECASE regex
+scan for every miss) with the SiteMatcher engine, and with a per-site
+Aho-Corasick automaton when pyahocorasick is installed.
+
+    python -m benchmarks.bench_wmn_matcher [--body-kb 1024] [--rounds 20]
+
+Uses cache/wmn-data.json when present, otherwise synthetic markers.
+"""
+import argparse
+import json
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.wmn_matcher import SiteMatcher  # noqa: E402
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+SNAPSHOT = Path(__file__).parent.parent / "cache" / "wmn-data.json"
+
+
+def load_sites(limit: int) -> list:
+    if SNAPSHOT.exists():
+        sites = json.loads(SNAPSHOT.read_text()).get("sites", [])
+        sites = [s for s in sites if s.get("e_string") and s.get("m_string")]
+        if sites:
+            return sites[:limit]
+
+    rng = random.Random(7)
+    sites = []
+    for i in range(limit):
+        sites.append({
+            "name": f"site{i}",
+            "e_string": f"Profile of {''.join(rng.choices(string.ascii_letters, k=8))}",
+            "m_string": f"page {''.join(rng.choices(string.ascii_letters, k=8))} not found",
+        })
+    return sites
+
+
+def make_body(size_kb: int) -> str:
+    rng = random.Random(1)
+    words = ["".join(rng.choices(string.ascii_letters, k=rng.randint(2, 9))) for _ in range(5000)]
+    body = " ".join(rng.choices(words, k=size_kb * 200))
+    return body[:size_kb * 1024]
+
+
+class LegacyMatcher:
+    """The pre-engine path: literal check, then regex per pattern"""
+
+    def __init__(self, e_string: str, m_string: str):
+        self.patterns = []
+        for pattern in (m_string, e_string):
+            try:
+                self.patterns.append((pattern, re.compile(pattern, re.IGNORECASE)))
+            except re.error:
+                self.patterns.append((pattern, None))
+
+    def evaluate(self, text: str):
+        hits = []
+        for pattern, regex in self.patterns:
+            hits.append(pattern in text or bool(regex and regex.search(text)))
+        return tuple(hits)
+
+
+class AhoCorasickMatcher:
+    """One automaton per site over both case-folded markers"""
+
+    def __init__(self, e_string: str, m_string: str):
+        self.automaton = ahocorasick.Automaton()
+        self.automaton.add_word(m_string.lower(), 2)
+        if e_string.lower() != m_string.lower():
+            self.automaton.add_word(e_string.lower(), 1)
+        self.automaton.make_automaton()
+
+    def evaluate(self, text: str):
+        hits = 0
+        for _, flag in self.automaton.iter(text.lower()):
+            hits |= flag
+            if hits & 2:
+                break
+        return bool(hits & 2), bool(hits & 1)
+
+
+def bench(name: str, matchers: list, body: str, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for matcher in matchers:
+            matcher.evaluate(body)
+    elapsed = time.perf_counter() - start
+    per_body = elapsed / (rounds * len(matchers)) * 1000
+    print(f"{name:<14} {per_body:8.3f} ms/body   {elapsed:7.2f} s total")
+    return per_body
+
+
+class EngineAdapter:
+    def __init__(self, e_string: str, m_string: str):
+        self.matcher = SiteMatcher(e_string, m_string)
+
+    def evaluate(self, text: str):
+        return self.matcher.evaluate(text, True, True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=50)
+    parser.add_argument("--body-kb", type=int, default=512)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    sites = load_sites(args.sites)
+    body = make_body(args.body_kb)
+    print(f"{len(sites)} sites, {args.body_kb} KB body (markers absent: worst case), {args.rounds} rounds")
+
+    legacy = bench("legacy", [LegacyMatcher(s["e_string"], s["m_string"]) for s in sites], body, args.rounds)
+    engine = bench("site_matcher", [EngineAdapter(s["e_string"], s["m_string"]) for s in sites], body, args.rounds)
+    if ahocorasick:
+        bench("aho_corasick", [AhoCorasickMatcher(s["e_string"], s["m_string"]) for s in sites], body, args.rounds)
+    else:
+        print("aho_corasick   skipped (pip install pyahocorasick)")
+
+    print(f"site_matcher speedup vs legacy: {legacy / engine:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,14 @@ TOKEN_REGISTRY: dict[str, dict] = {
         "sensitive":   True,
         "hint":        "Generate at https://bcrypt-generator.com/ — never store plaintext",
     },
+    "USERNAME_SEARCH_SHARDS": {
+        "label":       "Username Search Shards",
+        "description": "Worker processes for sharded username searches (?sharded=true). Empty or 0 disables sharding.",
+        "required":    False,
+        "category":    "app",
+        "sensitive":   False,
+        "hint":        "e.g. 8 — roughly the number of CPU cores to dedicate",
+    },
 
     "GITFIVE_VENV_PATH": {
         "label":       "GitFive — Venv Python Path",
@@ -152,6 +152,7 @@ class OsintFrameWork:
             (funstat_routes.search_router, "Funstat Search"),
             (funstat_routes.media_router, "Funstat Media"),
             (funstat_routes.bot_router, "Funstat Bot"),
+            (funstat_routes.client_router, "Funstat Client"),
             (web_search_routes.osint_router, "Web Search"),
             (resources_routes.router, "Resources"),
             (settings_routes.router, "Settings"),
@@ -0,0 +1,11 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+class UsernameExportRequest(BaseModel):
+    usernames: List[str] = Field(..., min_length=1)
+    format: Literal["ndjson", "parquet"] = "ndjson"
+    found_only: bool = True
+    extract_profile: bool = False
+    categories: Optional[List[str]] = None
+    refresh: Optional[List[str]] = None
+    sharded: bool = False
@@ -1,7 +1,10 @@
 from ast import Dict
+import json
 import os
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+from services.funstat_cache import FunstatResponseCache, cache_bypass
 from services.funstat_service import FunstatService
 from models.funstat_models import (
     CombinedUserHistory,
@@ -24,7 +27,8 @@ from config.token_manager import tokens
 
 funstat_service = FunstatService(
     api_key=tokens.get("FUNSTAT_API_KEY"),
-    base_url="https://telelog.org"
+    base_url="https://telelog.org",
+    cache=FunstatResponseCache()
 )
 
 telethon_service = TelethonMediaService(
@@ -33,11 +37,42 @@ telethon_service = TelethonMediaService(
     phone=tokens.get("TELEGRAM_PHONE_NUMBER", "your_phone_number")
 )
 
-user_router = APIRouter(prefix="/funstat/users", tags=["Users"])
-group_router = APIRouter(prefix="/funstat/groups", tags=["Groups"])
-search_router = APIRouter(prefix="/funstat/search", tags=["Search"])
-media_router = APIRouter(prefix="/funstat/media", tags=["Media"])
+async def funstat_cache_control(
+    no_cache: bool = Query(False, description="Skip the response cache; paid endpoints are billed again")
+):
+    cache_bypass.set(no_cache)
+
+_cache_control = [Depends(funstat_cache_control)]
+
+user_router = APIRouter(prefix="/funstat/users", tags=["Users"], dependencies=_cache_control)
+group_router = APIRouter(prefix="/funstat/groups", tags=["Groups"], dependencies=_cache_control)
+search_router = APIRouter(prefix="/funstat/search", tags=["Search"], dependencies=_cache_control)
+media_router = APIRouter(prefix="/funstat/media", tags=["Media"], dependencies=_cache_control)
 bot_router = APIRouter(prefix="/funstat/bot", tags=["Bot"])
+client_router = APIRouter(prefix="/funstat/client", tags=["Client"])
+
+@user_router.on_event("startup")
+async def start_funstat_client():
+    await funstat_service.start()
+
+@user_router.on_event("shutdown")
+async def stop_funstat_client():
+    await funstat_service.aclose()
+
+@client_router.get("/stats")
+async def get_funstat_client_stats() -> dict:
+    """Pooled Funstat client: connections opened, TLS handshakes and request latency"""
+    return funstat_service.client_state()
+
+@client_router.get("/cache")
+async def get_funstat_cache_stats() -> dict:
+    """Response cache hits, stale hits and the credits they saved"""
+    return await funstat_service.cache.stats()
+
+@client_router.delete("/cache")
+async def clear_funstat_cache() -> dict:
+    await funstat_service.cache.clear()
+    return {"success": True}
 
 # ==================== USER ROUTES ====================
 
@@ -125,6 +160,42 @@ async def get_all_user_messages(
         max_messages=max_messages
     )
 
+@user_router.get("/{user_id}/messages/all/stream")
+async def stream_all_user_messages(
+    user_id: int,
+    group_id: Optional[int] = None,
+    text_contains: Optional[str] = None,
+    media_code: Optional[int] = None,
+    max_messages: Optional[int] = None,
+    include_messages: bool = True,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$")
+):
+    """
+    Same data as /messages/all, streamed page by page as NDJSON or SSE:
+    a "started" record, one "page" record per page (messages and the
+    analyses of its sensitive messages), then a "summary" record.
+    COST: 10 per user if found and user has MORE THAN 100 messages
+    """
+    records = funstat_service.stream_all_user_messages(
+        user_id=user_id,
+        group_id=group_id,
+        text_contains=text_contains,
+        media_code=media_code,
+        max_messages=max_messages,
+        include_messages=include_messages
+    )
+
+    async def generate():
+        async for record in records:
+            line = json.dumps(record, default=str)
+            yield f"data: {line}\n\n" if format == "sse" else line + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @user_router.get("/{user_id}/names")
 async def get_user_names_history(user_id: int) -> List[UserNamesHistory]:
     """Get user's name history (COST: 3)"""
@@ -1,35 +1,152 @@
+import asyncio
 import logging
 from typing import List, Optional
-from collections import defaultdict
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, File, Form, Header, HTTPException, Query, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-from services.username_service import StreamingUsernameSearchService
+from config.token_manager import tokens
+from models.username_models import UsernameExportRequest
+from services.dns_cache import dns_cache
+from services.username_export_jobs import ExportJobManager, parse_usernames
+from services.username_result_cache import SQLiteResultCache
+from services.username_event_codec import available_encodings, decode_frame, encode_events, encode_frame
+from services.username_search_jobs import SearchJob, SearchJobManager, parse_event_id
+from services.username_service import SearchControl, StreamingUsernameSearchService
+from services.username_shards import ShardedSearchPool
 
 router = APIRouter(prefix="/api/username")
 
-search_service = StreamingUsernameSearchService()
+search_service = StreamingUsernameSearchService(
+    result_cache=SQLiteResultCache(),
+    http2=True,
+    hedge_requests=True
+)
+_shards = tokens.get("USERNAME_SEARCH_SHARDS").strip()
+shard_pool = None
+if _shards.isdigit() and int(_shards) > 0:
+    shard_pool = ShardedSearchPool(search_service, shards=int(_shards))
+search_jobs = SearchJobManager(search_service, shard_pool=shard_pool)
+export_jobs = ExportJobManager(search_service, shard_pool=shard_pool)
+
+MAX_BATCH_USERNAMES = 50
+MAX_EXPORT_UPLOAD_BYTES = 5 * 1024 * 1024
 
 logger = logging.getLogger("username_routes")
 logging.basicConfig(level=logging.INFO)
 
+
+@router.on_event("startup")
+async def start_metadata_store():
+    await search_service.metadata_store.start()
+    await search_service.latency_profile.start()
+    await search_service.profile_extractor.start()
+    if shard_pool:
+        await shard_pool.start()
+    await search_jobs.start()
+    # Resolve WMN hosts in the background; the first search should not pay for ~500 lookups
+    asyncio.create_task(dns_cache.warm(await search_service.site_hosts()))
+
+
+@router.on_event("shutdown")
+async def stop_metadata_store():
+    await export_jobs.stop()
+    await search_jobs.stop()
+    if shard_pool:
+        await shard_pool.stop()
+    await search_service.metadata_store.stop()
+    await search_service.latency_profile.stop()
+    await search_service.profile_extractor.stop()
+    if search_service.http2_client:
+        await search_service.http2_client.aclose()
+    await dns_cache.shutdown()
+
 @router.get("/search/stream")
 async def stream_search_sse(
     username: str = Query(..., description="Username to search"),
     include_duckduckgo: bool = Query(False, description="Include DuckDuckGo results"),
     extract_profile: bool = Query(False, description="Extract profile data"),
     categories: Optional[List[str]] = Query(None, description="Filter by categories"),
-    priority_sites: Optional[List[str]] = Query(None, description="Priority sites to check first")
+    priority_sites: Optional[List[str]] = Query(None, description="Priority sites to check first"),
+    refresh: Optional[List[str]] = Query(None, description="Re-check cached results of these classes: found, not_found, error, all"),
+    sharded: bool = Query(False, description="Split the sites across the shard worker processes"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
 ):
+    """
+    Start a search job and follow it.
+
+    The search keeps running if the client disconnects. Event ids carry the
+    search_id, so an EventSource reconnecting here with Last-Event-ID resumes
+    the same job instead of starting a new scan; /search/{search_id}/stream
+    resumes by id. A reconnect with nothing left to deliver (the job was
+    collected, or finished and fully sent) gets 204, which tells EventSource
+    to stop retrying.
+    """
+    if last_event_id_header:
+        search_id, last_event_id = _parse_last_event_id(last_event_id_header)
+        if search_id is not None:
+            job = search_jobs.find(search_id)
+            if job is None or (job.done and last_event_id >= len(job.events) - 1):
+                return Response(status_code=204)
+            return _job_stream(job, last_event_id)
+
+    job = search_jobs.create(
+        username,
+        sharded=sharded,
+        include_duckduckgo=include_duckduckgo,
+        extract_profile=extract_profile,
+        categories=categories,
+        priority_sites=priority_sites,
+        refresh=refresh
+    )
+    return _job_stream(job, None)
+
+def _parse_last_event_id(value: str):
+    try:
+        return parse_event_id(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be <search_id>:<event index>")
+
+def _job_stream(job: SearchJob, last_event_id: Optional[int]) -> StreamingResponse:
     async def generate():
-        async for event in search_service.stream_search(
-            username=username,
+        async for batch in search_jobs.follow(job, last_event_id):
+            yield "".join(event.to_sse(f"{job.search_id}:{event_id}") for event_id, event in batch)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "X-Search-Id": job.search_id
+        }
+    )
+
+@router.get("/search/batch/stream")
+async def stream_batch_search_sse(
+    usernames: List[str] = Query(..., description="Usernames to search"),
+    include_duckduckgo: bool = Query(False, description="Include DuckDuckGo results"),
+    extract_profile: bool = Query(False, description="Extract profile data"),
+    categories: Optional[List[str]] = Query(None, description="Filter by categories"),
+    priority_sites: Optional[List[str]] = Query(None, description="Priority sites to check first"),
+    refresh: Optional[List[str]] = Query(None, description="Re-check cached results of these classes: found, not_found, error, all")
+):
+    if len(usernames) > MAX_BATCH_USERNAMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_USERNAMES} usernames per batch"
+        )
+
+    async def generate():
+        async for batch in search_service.stream_batch_search_batches(
+            usernames=usernames,
             include_duckduckgo=include_duckduckgo,
             extract_profile=extract_profile,
             categories=categories,
-            priority_sites=priority_sites
+            priority_sites=priority_sites,
+            refresh=refresh
         ):
-            yield event.to_sse()
+            yield "".join(event.to_sse() for event in batch)
 
     return StreamingResponse(
         generate(),
@@ -41,27 +158,238 @@ async def stream_search_sse(
         }
     )
 
+@router.websocket("/search/ws")
+async def search_websocket(websocket: WebSocket, encoding: str = "json"):
+    """
+    Username search over a WebSocket.
+
+    The client sends {"action": "start", "username": ..., plus any /search/stream
+    option}. The server answers with binary frames: batches as
+    {"type": "events", "events": [[event_type, data, timestamp], ...]} and
+    {"type": "ack" | "error", ...} replies, encoded as JSON or msgpack
+    (?encoding=msgpack). While the search runs the client may send
+    {"action": "cancel"}, {"action": "prioritize", "categories": [...], "sites": [...]}
+    or {"action": "add_sites", "sites": [...]}. The socket closes after
+    search_completed.
+    """
+    await websocket.accept()
+    if encoding not in available_encodings():
+        await websocket.send_bytes(encode_frame({
+            "type": "error",
+            "message": f"Unsupported encoding, use one of {available_encodings()}"
+        }))
+        await websocket.close(code=1003)
+        return
+
+    async def send(payload: dict):
+        await websocket.send_bytes(encode_frame(payload, encoding))
+
+    async def receive() -> dict:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        return decode_frame(message.get("bytes") or message.get("text") or "", encoding) or {}
+
+    try:
+        start = await receive()
+        while start.get("action") != "start" or not start.get("username"):
+            await send({"type": "error", "message": "Send {\"action\": \"start\", \"username\": ...} first"})
+            start = await receive()
+    except WebSocketDisconnect:
+        return
+
+    if start.get("sharded") and not (shard_pool and shard_pool.started):
+        await send({"type": "error", "message": "Sharded search is not enabled (USERNAME_SEARCH_SHARDS)"})
+        await websocket.close(code=1003)
+        return
+    source = shard_pool if start.get("sharded") else search_service
+    control = SearchControl()
+
+    async def read_commands():
+        try:
+            while True:
+                command = await receive()
+                action = command.get("action")
+                if action == "cancel":
+                    control.cancel()
+                elif action == "prioritize":
+                    control.prioritize(command.get("categories") or [], command.get("sites") or [])
+                elif action == "add_sites":
+                    control.add_sites(command.get("sites") or [])
+                else:
+                    await send({"type": "error", "message": f"Unknown action {action!r}"})
+                    continue
+                await send({"type": "ack", "action": action})
+        except WebSocketDisconnect:
+            control.cancel()
+
+    stream = source.stream_search_batches(
+        username=start["username"],
+        include_duckduckgo=bool(start.get("include_duckduckgo", False)),
+        extract_profile=bool(start.get("extract_profile", False)),
+        categories=start.get("categories"),
+        priority_sites=start.get("priority_sites"),
+        refresh=start.get("refresh"),
+        control=control
+    )
+    reader = asyncio.create_task(read_commands())
+    try:
+        async for batch in stream:
+            await websocket.send_bytes(encode_events(batch, encoding))
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        # Client went away mid-send
+        return
+    finally:
+        reader.cancel()
+        await stream.aclose()
+
+    await websocket.close()
+
+@router.get("/search/{search_id}/stream")
+async def attach_search_sse(
+    search_id: str,
+    last_event_id: Optional[int] = Query(None, description="Resume after this event index"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    job = search_jobs.get(search_id)
+    if last_event_id is None and last_event_id_header:
+        header_search_id, last_event_id = _parse_last_event_id(last_event_id_header)
+        if header_search_id not in (None, search_id):
+            raise HTTPException(status_code=400, detail="Last-Event-ID belongs to another search")
+    return _job_stream(job, last_event_id)
+
+@router.get("/search/{search_id}")
+async def get_search_job(search_id: str):
+    return search_jobs.get(search_id).summary()
+
+@router.delete("/search/{search_id}")
+async def cancel_search_job(search_id: str):
+    job = await search_jobs.cancel(search_id)
+    return job.summary()
+
+@router.get("/searches")
+async def get_search_jobs_stats():
+    return search_jobs.stats()
+
+@router.post("/exports")
+async def create_export(request: UsernameExportRequest):
+    """
+    Search every username in the background and write the results to a
+    report file; poll /exports/{export_id} for progress.
+    """
+    job = export_jobs.create(
+        request.usernames,
+        export_format=request.format,
+        found_only=request.found_only,
+        sharded=request.sharded,
+        extract_profile=request.extract_profile,
+        categories=request.categories,
+        refresh=request.refresh
+    )
+    return job.summary()
+
+@router.post("/exports/upload")
+async def create_export_from_file(
+    file: UploadFile = File(..., description="One username per line, or a CSV with usernames in the first column"),
+    format: str = Form("ndjson"),
+    found_only: bool = Form(True),
+    extract_profile: bool = Form(False),
+    categories: Optional[List[str]] = Form(None),
+    sharded: bool = Form(False)
+):
+    content = await file.read(MAX_EXPORT_UPLOAD_BYTES + 1)
+    if len(content) > MAX_EXPORT_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Username list is too large")
+    try:
+        usernames = parse_usernames(content.decode("utf-8-sig"))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Username list must be UTF-8 text")
+
+    job = export_jobs.create(
+        usernames,
+        export_format=format,
+        found_only=found_only,
+        sharded=sharded,
+        extract_profile=extract_profile,
+        categories=categories
+    )
+    return job.summary()
+
+@router.get("/exports")
+async def get_exports():
+    return export_jobs.stats()
+
+@router.get("/exports/{export_id}")
+async def get_export(export_id: str):
+    return export_jobs.get(export_id).summary()
+
+@router.delete("/exports/{export_id}")
+async def cancel_export(export_id: str):
+    job = await export_jobs.cancel(export_id)
+    return job.summary()
+
+@router.get("/cache/stats")
+async def get_result_cache_stats():
+    return search_service.result_cache.stats()
+
+@router.delete("/cache")
+async def clear_result_cache():
+    await search_service.result_cache.clear()
+    return {"success": True}
+
+@router.get("/rate-limits")
+async def get_rate_limits(host: Optional[str] = Query(None, description="Limit to one host")):
+    return search_service.rate_limiter.host_state(host)
+
+@router.get("/site-latency")
+async def get_site_latency(site: Optional[str] = Query(None, description="Limit to one site")):
+    return search_service.latency_profile.site_state(site)
+
+@router.get("/profile-extraction")
+async def get_profile_extraction_stats():
+    return search_service.profile_extractor.stats()
+
+@router.get("/transport")
+async def get_transport_state():
+    http2_client = search_service.http2_client
+    return {
+        "http2_enabled": http2_client is not None,
+        **(http2_client.state() if http2_client else {"http1_hosts": []})
+    }
+
+@router.get("/shards")
+async def get_shard_stats():
+    return shard_pool.stats() if shard_pool else {"shards": 0}
+
+@router.get("/dns")
+async def get_dns_cache_stats():
+    return dns_cache.stats()
+
 @router.get("/metadata")
-async def get_metadata():
+async def get_metadata(
+    category: Optional[str] = Query(None, description="List every site in this category"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Site counts per category (or the sites of one category) for the current
+    WMN metadata version. Served from the per-version index; the ETag is the
+    metadata version, so unchanged metadata answers 304.
+    """
     try:
-        metadata = search_service.get_metadata()
-        sites = metadata.get("sites", [])
-
-        categories = defaultdict(int)
-        for site in sites:
-            categories[site.get("cat", "unknown")] += 1
-
-        return {
-            "total_sites": len(sites),
-            "categories": dict(categories),
-            "sites": [
-                {
-                    "name": site.get("name"),
-                    "category": site.get("cat"),
-                    "url": site.get("uri_check")
-                }
-                for site in sites[:10]
-            ]
-        }
+        index = await search_service.get_site_index()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    etag = f'"{index.version}"' if category is None else f'"{index.version}:{category}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if category is None:
+        return JSONResponse(index.summary, headers=headers)
+    return JSONResponse({
+        "version": index.version,
+        "category": category,
+        "total_sites": index.category_counts.get(category, 0),
+        "sites": index.category(category)
+    }, headers=headers)
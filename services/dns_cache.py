@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import socket
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import ThreadedResolver
+
+logger = logging.getLogger(__name__)
+
+try:
+    import aiodns  # noqa: F401  (backs aiohttp.AsyncResolver)
+    AIODNS_AVAILABLE = True
+except ImportError:
+    AIODNS_AVAILABLE = False
+
+
+class DNSCache(AbstractResolver):
+    """
+    Process-wide resolver cache shared by every aiohttp connector.
+
+    Each connector otherwise keeps its own DNS cache, so a fresh search
+    session re-resolves every WMN host. Answers are kept for ttl_seconds and
+    failures for negative_ttl_seconds; concurrent lookups of the same host
+    share one query. Resolution goes through aiodns when it is installed and
+    getaddrinfo in a thread otherwise.
+
+    Pass it as TCPConnector(resolver=dns_cache, use_dns_cache=False), or use
+    connector(). close() is a no-op so connectors cannot tear down the shared
+    backend; shutdown() does that.
+    """
+
+    def __init__(self,
+                 ttl_seconds: float = 300,
+                 negative_ttl_seconds: float = 30,
+                 max_entries: int = 10000,
+                 timeout_seconds: float = 5.0):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.timeout_seconds = timeout_seconds
+
+        self._backend: Optional[AbstractResolver] = None
+        self._backend_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Optional[List[ResolveResult]], Optional[str]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._latencies = deque(maxlen=1024)
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.coalesced = 0
+
+    def _get_backend(self) -> AbstractResolver:
+        loop = asyncio.get_running_loop()
+        if self._backend is None or self._backend_loop is not loop:
+            self._backend = aiohttp.AsyncResolver() if AIODNS_AVAILABLE else ThreadedResolver()
+            self._backend_loop = loop
+        return self._backend
+
+    def _remember(self, key: Tuple[str, int], ttl: float,
+                  addrs: Optional[List[ResolveResult]], error: Optional[str]):
+        self._entries[key] = (time.monotonic() + ttl, addrs, error)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _with_port(addrs: List[ResolveResult], port: int) -> List[ResolveResult]:
+        return [{**addr, "port": port} for addr in addrs]
+
+    async def resolve(self,
+                      host: str,
+                      port: int = 0,
+                      family: socket.AddressFamily = socket.AF_INET) -> List[ResolveResult]:
+        """Addresses for host, from cache when fresh; raises OSError like aiohttp's resolvers"""
+        key = (host.lower(), int(family))
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, addrs, error = entry
+            if expires_at > time.monotonic():
+                if addrs is None:
+                    self.negative_hits += 1
+                    raise OSError(f"Cannot resolve {host}: {error}")
+                self.hits += 1
+                return self._with_port(addrs, port)
+            del self._entries[key]
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            self.misses += 1
+            pending = asyncio.ensure_future(self._query(key, host, family))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        addrs, error = await asyncio.shield(pending)
+        if addrs is None:
+            raise OSError(f"Cannot resolve {host}: {error}")
+        return self._with_port(addrs, port)
+
+    async def _query(self, key: Tuple[str, int], host: str,
+                     family: socket.AddressFamily) -> Tuple[Optional[List[ResolveResult]], Optional[str]]:
+        start = time.perf_counter()
+        try:
+            addrs = await asyncio.wait_for(
+                self._get_backend().resolve(host, 0, family), timeout=self.timeout_seconds
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            error = str(e) or type(e).__name__
+            self._remember(key, self.negative_ttl_seconds, None, error)
+            return None, error
+        finally:
+            self._latencies.append(time.perf_counter() - start)
+        self._remember(key, self.ttl_seconds, addrs, None)
+        return addrs, None
+
+    async def lookup(self, host: str, family: socket.AddressFamily = socket.AF_INET) -> List[str]:
+        """IP addresses for host (the socket.gethostbyname use case)"""
+        return [addr["host"] for addr in await self.resolve(host, 0, family)]
+
+    async def warm(self, hosts: Iterable[str], concurrency: int = 50) -> int:
+        """Resolve hosts ahead of use; returns how many resolved"""
+        hosts = list(dict.fromkeys(h.lower() for h in hosts if h))
+        if not hosts:
+            return 0
+        slots = asyncio.Semaphore(concurrency)
+
+        async def warm_one(host: str) -> bool:
+            async with slots:
+                try:
+                    await self.resolve(host, 0, socket.AF_INET)
+                    return True
+                except OSError:
+                    return False
+
+        start = time.perf_counter()
+        resolved = sum(await asyncio.gather(*[warm_one(host) for host in hosts]))
+        logger.info(
+            f"Warmed DNS cache: {resolved}/{len(hosts)} hosts in {time.perf_counter() - start:.2f}s"
+        )
+        return resolved
+
+    def clear(self):
+        self._entries.clear()
+
+    async def close(self) -> None:
+        """Connectors call this; the shared cache outlives them"""
+
+    async def shutdown(self):
+        backend, self._backend = self._backend, None
+        self._backend_loop = None
+        if backend is not None:
+            await backend.close()
+
+    def stats(self) -> dict:
+        ordered = sorted(self._latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        now = time.monotonic()
+        return {
+            "backend": "aiodns" if AIODNS_AVAILABLE else "getaddrinfo",
+            "entries": len(self._entries),
+            "negative_entries": sum(
+                1 for expires_at, addrs, _ in self._entries.values() if addrs is None and expires_at > now
+            ),
+            "lookups": lookups,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "failures": self.failures,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else None,
+            "resolve_ms_p50": percentile(0.5),
+            "resolve_ms_p95": percentile(0.95),
+            "ttl_seconds": self.ttl_seconds,
+            "negative_ttl_seconds": self.negative_ttl_seconds,
+        }
+
+
+dns_cache = DNSCache()
+
+
+def connector(**kwargs) -> aiohttp.TCPConnector:
+    """TCPConnector resolving through the shared cache"""
+    return aiohttp.TCPConnector(resolver=dns_cache, use_dns_cache=False, **kwargs)
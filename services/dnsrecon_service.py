@@ -11,6 +11,7 @@ import dns.resolver
 import whois
 
 from config.token_manager import tokens
+from services.dns_cache import dns_cache
 
 class DNSReconService:
     def __init__(self):
@@ -293,7 +294,7 @@ class DNSReconService:
         results = []
 
         try:
-            ip = socket.gethostbyname(domain)
+            ip = (await dns_cache.lookup(domain))[0]
 
             for port in common_ports:
                 try:
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent / "cache" / "funstat_responses.sqlite3"
+
+# Seconds a cached response stays fresh, per endpoint class
+DEFAULT_TTLS = {
+    "profile": 6 * 3600,
+    "counts": 3600,
+    "history": 24 * 3600,
+    "groups": 12 * 3600,
+    "messages": 6 * 3600,
+}
+
+# GET endpoint -> (TTL class, documented cost). The documented cost is only
+# used when a response carries no tech.requestCost; message pages are billed
+# per user, not per page, so they rely on tech alone. Endpoints not listed
+# (bot/random) are never cached or coalesced.
+ENDPOINT_POLICIES: List[Tuple[str, str, float]] = [
+    (r"/api/v1/users/(basic_info_by_id|resolve_username)", "profile", 0.1),
+    (r"/api/v1/users/-?\d+/stats_min", "profile", 0),
+    (r"/api/v1/users/-?\d+/stats", "profile", 1),
+    (r"/api/v1/users/reputation", "profile", 0),
+    (r"/api/v1/users/-?\d+/(groups_count|messages_count)", "counts", 0),
+    (r"/api/v1/users/-?\d+/(names|usernames)", "history", 3),
+    (r"/api/v1/users/-?\d+/stickers", "history", 1),
+    (r"/api/v1/users/-?\d+/common_groups_stat", "history", 0),
+    (r"/api/v1/users/username_usage", "history", 0.1),
+    (r"/api/v1/users/-?\d+/groups", "groups", 5),
+    (r"/api/v1/groups/-?\d+", "groups", 0.01),
+    (r"/api/v1/groups/-?\d+/members", "groups", 15),
+    (r"/api/v1/groups/common_groups", "groups", 0.5),
+    (r"/api/v1/users/-?\d+/messages", "messages", 0),
+    (r"/api/v1/text/search", "messages", 0.1),
+]
+_COMPILED_POLICIES = [(re.compile(pattern), ttl_class, cost) for pattern, ttl_class, cost in ENDPOINT_POLICIES]
+
+# Set per request (the routes' no_cache flag); True skips the cache lookup
+# and overwrites the entry with the fresh response
+cache_bypass: ContextVar[bool] = ContextVar("funstat_cache_bypass", default=False)
+
+
+@dataclass
+class CachedResponse:
+    """A stored Funstat response payload"""
+    payload: Any
+    ttl_class: str
+    cost: float
+    stored_at: float
+    fresh: bool
+
+
+class FunstatResponseCache:
+    """
+    Persistent (endpoint, params) -> response cache for the Funstat API.
+
+    Entries are fresh for their class TTL and may be served stale for
+    stale_seconds beyond it while the caller refreshes them in the
+    background. Every fresh hit is credited with the credits the original
+    call cost, kept per class across restarts. All database work runs in a
+    worker thread.
+    """
+
+    def __init__(self,
+                 path: Path = DEFAULT_DB_PATH,
+                 ttls: Optional[Dict[str, float]] = None,
+                 stale_seconds: float = 3 * 24 * 3600,
+                 max_entries: int = 50_000):
+        self.path = Path(path)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.refreshes = 0
+        self.credits_saved = 0.0
+
+    @staticmethod
+    def policy(method: str, endpoint: str) -> Optional[Tuple[str, float]]:
+        """(TTL class, documented cost) for a cacheable call, else None"""
+        if method.upper() != "GET":
+            return None
+        for pattern, ttl_class, cost in _COMPILED_POLICIES:
+            if pattern.fullmatch(endpoint):
+                return ttl_class, cost
+        return None
+
+    @staticmethod
+    def key(method: str, endpoint: str, params: Optional[Dict], json_data: Optional[Dict]) -> str:
+        return json.dumps([method.upper(), endpoint, params or {}, json_data], sort_keys=True, default=str)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    ttl_class TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    cost REAL NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS savings (
+                    ttl_class TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL,
+                    credits REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _select(self, key: str) -> Optional[Tuple[str, str, float, float]]:
+        with self._db_lock:
+            return self._connect().execute(
+                "SELECT payload, ttl_class, cost, stored_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+    def _record_hit(self, key: str, ttl_class: str, cost: float):
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            conn.execute(
+                "INSERT INTO savings (ttl_class, hits, credits) VALUES (?, 1, ?) "
+                "ON CONFLICT(ttl_class) DO UPDATE SET hits = hits + 1, credits = credits + excluded.credits",
+                (ttl_class, cost)
+            )
+            conn.commit()
+
+    def _write(self, row: Tuple[str, str, str, str, float, float, float]):
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, endpoint, ttl_class, payload, cost, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row
+            )
+            count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE rowid IN "
+                    "(SELECT rowid FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (excess,)
+                )
+            conn.commit()
+
+    def _delete_all(self):
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def _summary(self) -> Tuple[int, List[Tuple[str, int, float]]]:
+        with self._db_lock:
+            conn = self._connect()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            savings = conn.execute("SELECT ttl_class, hits, credits FROM savings ORDER BY ttl_class").fetchall()
+            return entries, savings
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """The entry when fresh or still within the stale window, else None"""
+        try:
+            row = await asyncio.to_thread(self._select, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Funstat cache read failed: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+
+        payload, ttl_class, cost, stored_at = row
+        age = time.time() - stored_at
+        ttl = self.ttls.get(ttl_class, 0)
+        if age >= ttl + self.stale_seconds:
+            self.misses += 1
+            return None
+
+        fresh = age < ttl
+        if fresh:
+            self.hits += 1
+            self.credits_saved += cost
+            try:
+                await asyncio.to_thread(self._record_hit, key, ttl_class, cost)
+            except sqlite3.Error as e:
+                logger.warning(f"Funstat cache hit accounting failed: {e}")
+        else:
+            # Served now, but the background refresh bills the call again
+            self.stale_hits += 1
+        return CachedResponse(
+            payload=json.loads(payload), ttl_class=ttl_class, cost=cost, stored_at=stored_at, fresh=fresh
+        )
+
+    async def put(self, key: str, endpoint: str, ttl_class: str, payload: Any, documented_cost: float):
+        cost = documented_cost
+        if isinstance(payload, dict) and isinstance(payload.get("tech"), dict):
+            cost = payload["tech"].get("requestCost", cost) or 0
+        now = time.time()
+        try:
+            await asyncio.to_thread(
+                self._write, (key, endpoint, ttl_class, json.dumps(payload), float(cost), now, now)
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Funstat cache write failed for {endpoint}: {e}")
+
+    async def clear(self):
+        await asyncio.to_thread(self._delete_all)
+
+    async def stats(self) -> dict:
+        entries, savings = await asyncio.to_thread(self._summary)
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "background_refreshes": self.refreshes,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "credits_saved": round(self.credits_saved, 2),
+            "credits_saved_total": round(sum(credits for _, _, credits in savings), 2),
+            "saved_by_class": {
+                ttl_class: {"hits": hits, "credits": round(credits, 2)}
+                for ttl_class, hits, credits in savings
+            },
+            "ttls": self.ttls,
+            "stale_seconds": self.stale_seconds,
+            "max_entries": self.max_entries,
+        }
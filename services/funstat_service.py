@@ -1,9 +1,14 @@
+import asyncio
+import itertools
 import json
 import re
+import time
 import httpx
-from typing import List, Optional, Dict, Any
+from collections import deque
+from typing import AsyncGenerator, List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException
 import logging
+from services.funstat_cache import FunstatResponseCache, cache_bypass
 from models.funstat_models import (
     TechInfo,
     ResolvedUser,
@@ -23,15 +28,156 @@ from models.funstat_models import (
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class FunstatClientStats:
+    """Requests, new connections and latency of the pooled Funstat client"""
+
+    def __init__(self, window: int = 1024):
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+        self.single_flight_calls = 0
+        self.coalesced = 0
+        self._latencies = deque(maxlen=window)
+        self._endpoints: Dict[str, List[float]] = {}
+        self._coalesced_by_endpoint: Dict[str, int] = {}
+
+    async def trace(self, event_name: str, info: Dict[str, Any]):
+        """httpcore trace hook; fires only when the pool opens a new connection"""
+        if event_name == "connection.connect_tcp.complete":
+            self.connections += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    @staticmethod
+    def _fold(endpoint: str) -> str:
+        # /api/v1/users/123/stats and /api/v1/users/456/stats are one endpoint
+        return re.sub(r"/-?\d+", "/{id}", endpoint)
+
+    def record(self, endpoint: str, seconds: float, http_version: Optional[str]):
+        self.requests += 1
+        if http_version == "HTTP/2":
+            self.http2_requests += 1
+        self._latencies.append(seconds)
+        totals = self._endpoints.setdefault(self._fold(endpoint), [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def record_coalesced(self, endpoint: str):
+        self.coalesced += 1
+        endpoint = self._fold(endpoint)
+        self._coalesced_by_endpoint[endpoint] = self._coalesced_by_endpoint.get(endpoint, 0) + 1
+
+    def to_dict(self) -> dict:
+        ordered = sorted(self._latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": self.connections,
+            "tls_handshakes": self.tls_handshakes,
+            "requests_per_connection": round(self.requests / self.connections, 2) if self.connections else None,
+            "http2_requests": self.http2_requests,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": round(ordered[-1] * 1000, 1) if ordered else None,
+            "endpoints": {
+                endpoint: {"requests": count, "avg_ms": round(total / count * 1000, 1)}
+                for endpoint, (count, total) in sorted(self._endpoints.items())
+            },
+            "single_flight": {
+                "upstream_calls": self.single_flight_calls,
+                "coalesced": self.coalesced,
+                "dedup_ratio": round(
+                    self.coalesced / (self.coalesced + self.single_flight_calls), 4
+                ) if self.coalesced else 0.0,
+                "coalesced_by_endpoint": dict(sorted(self._coalesced_by_endpoint.items())),
+            },
+        }
+
 
 class FunstatService:
-    def __init__(self, api_key: str, base_url: str = "https://telelog.org"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://telelog.org",
+        timeout: float = 30.0,
+        http2: bool = True,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        page_concurrency: int = 8,
+        cache: Optional[FunstatResponseCache] = None
+    ):
         self.api_key = api_key
         self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.timeout = timeout
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested for Funstat but h2 is not installed; using HTTP/1.1")
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.page_concurrency = page_concurrency
+        self.cache = cache
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.client_stats = FunstatClientStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        One pooled client for the service's lifetime, so consecutive calls
+        (and every page of a message pull) reuse warm connections instead of
+        paying a TCP + TLS handshake each.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=self.limits
+            )
+        return self._client
+
+    async def start(self):
+        self._get_client()
+
+    async def aclose(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def client_state(self) -> dict:
+        return {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "in_flight_lookups": len(self._inflight),
+            **self.client_stats.to_dict(),
+        }
 
     async def _make_request(
         self,
@@ -40,41 +186,143 @@ class FunstatService:
         params: Optional[Dict] = None,
         json_data: Optional[Dict] = None
     ) -> Dict[str, Any]:
-        """Make HTTP request to Funstat API"""
+        """
+        Make HTTP request to Funstat API. Lookups (the cacheable GET
+        endpoints) go through the response cache when there is one: stale
+        entries are returned at once and refreshed in the background, and
+        cache_bypass skips the lookup. Identical lookups already in flight
+        share one upstream call.
+        """
+        policy = FunstatResponseCache.policy(method, endpoint)
+        if policy is None:
+            return await self._fetch(method, endpoint, params, json_data)
+
+        key = FunstatResponseCache.key(method, endpoint, params, json_data)
+        if self.cache and cache_bypass.get():
+            self.cache.bypassed += 1
+        elif self.cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                if not cached.fresh:
+                    self._refresh_in_background(key, method, endpoint, params, json_data, policy)
+                return cached.payload
+
+        return await self._single_flight(key, method, endpoint, params, json_data, policy)
+
+    async def _single_flight(self, key: str, method: str, endpoint: str, params: Optional[Dict],
+                             json_data: Optional[Dict], policy: Tuple[str, float]) -> Dict[str, Any]:
+        """
+        Fetch (and cache) a lookup, or join the identical one already in
+        flight. The shared call is shielded so one caller giving up does not
+        cancel it for the others; every caller gets the same payload or
+        the same HTTPException.
+        """
+        pending = self._inflight.get(key)
+        if pending is None:
+            self.client_stats.single_flight_calls += 1
+            pending = asyncio.ensure_future(self._fetch_and_store(key, method, endpoint, params, json_data, policy))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.client_stats.record_coalesced(endpoint)
+        return await asyncio.shield(pending)
+
+    async def _fetch_and_store(self, key: str, method: str, endpoint: str, params: Optional[Dict],
+                               json_data: Optional[Dict], policy: Tuple[str, float]) -> Dict[str, Any]:
+        payload = await self._fetch(method, endpoint, params, json_data)
+        if self.cache:
+            ttl_class, documented_cost = policy
+            await self.cache.put(key, endpoint, ttl_class, payload, documented_cost)
+        return payload
+
+    def _refresh_in_background(self, key: str, method: str, endpoint: str, params: Optional[Dict],
+                               json_data: Optional[Dict], policy: Tuple[str, float]):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._single_flight(key, method, endpoint, params, json_data, policy)
+            except HTTPException as e:
+                logger.warning(f"Background refresh of {endpoint} failed: {e.detail}")
+                return
+            self.cache.refreshes += 1
+
+        task = asyncio.create_task(refresh())
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _fetch(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        json_data: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """Make HTTP request to Funstat API over the pooled client"""
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                url = f"{self.base_url}{endpoint}"
-
-                response = await client.request(
-                    method=method,
-                    url=url,
-                    headers=self.headers,
-                    params=params,
-                    json=json_data
-                )
+            url = f"{self.base_url}{endpoint}"
+
+            response = await self._get_client().request(
+                method=method,
+                url=url,
+                headers=self.headers,
+                params=params,
+                json=json_data,
+                extensions={"trace": self.client_stats.trace}
+            )
+            self.client_stats.record(endpoint, time.perf_counter() - start, response.http_version)
 
-                response.raise_for_status()
-                return response.json()
+            response.raise_for_status()
+            return response.json()
 
         except httpx.HTTPStatusError as e:
+            self.client_stats.errors += 1
             logger.error(f"HTTP error: {e.response.status_code} - {e.response.text}")
             raise HTTPException(
                 status_code=e.response.status_code,
                 detail=f"Funstat API error: {e.response.text}"
             )
         except httpx.RequestError as e:
+            self.client_stats.errors += 1
             logger.error(f"Request error: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Request to Funstat API failed: {str(e)}"
             )
         except Exception as e:
+            self.client_stats.errors += 1
             logger.error(f"Unexpected error: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Unexpected error: {str(e)}"
             )
 
+    async def _iter_pages(self, fetch_page, pages) -> AsyncGenerator[Any, None]:
+        """
+        Yield fetch_page(n) for every page, in page order, with at most
+        page_concurrency requests in flight. Only that window of pages is
+        held at once; the next page starts as soon as the oldest is yielded.
+        """
+        pages = iter(pages)
+        window: deque = deque()
+        try:
+            for page in itertools.islice(pages, self.page_concurrency):
+                window.append(asyncio.create_task(fetch_page(page)))
+            while window:
+                response = await window.popleft()
+                for page in itertools.islice(pages, 1):
+                    window.append(asyncio.create_task(fetch_page(page)))
+                yield response
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def _fetch_pages(self, fetch_page, pages) -> List[Any]:
+        """fetch_page(n) for every page, at most page_concurrency in flight; results in page order"""
+        return [response async for response in self._iter_pages(fetch_page, pages)]
+
     # ==================== USER ENDPOINTS ====================
 
     async def get_user_basic_info_by_id(self, user_ids: List[int]) -> List[ResolvedUser]:
@@ -177,22 +425,19 @@ class FunstatService:
         media_code: Optional[int] = None,
         max_messages: Optional[int] = None
     ) -> Dict[str, Any]:
-        """Get ALL user messages by fetching all pages"""
-        all_messages = []
-        page = 1
+        """
+        Get ALL user messages by fetching all pages
+
+        Page 1 gives total_pages; the rest (or just the pages needed for
+        max_messages) are fetched page_concurrency at a time and put back in
+        page order. Any failed page fails the whole call, as before.
+        """
         page_size = 100  # Max page size for efficiency
-        total_fetched = 0
 
         logger.info(f"Fetching all messages for user {user_id}")
 
-        # with open("messages_all.json", "r") as f:
-        #     print("opened")
-        #     messages_all = json.load(f)
-
-        # return messages_all
-
-        while True:
-            response = await self.get_user_messages(
+        async def fetch_page(page: int) -> Dict[str, Any]:
+            return await self.get_user_messages(
                 user_id=user_id,
                 page=page,
                 page_size=page_size,
@@ -201,24 +446,21 @@ class FunstatService:
                 media_code=media_code
             )
 
-            messages = response["messages"]
-            paging = response["paging"]
-            tech = response["tech"]
+        first = await fetch_page(1)
+        last_page = first["paging"].total_pages
+        if max_messages:
+            last_page = min(last_page, -(-max_messages // page_size))
 
-            all_messages.extend(messages)
-            total_fetched += len(messages)
+        pages = [first] + await self._fetch_pages(fetch_page, range(2, last_page + 1))
 
-            logger.info(f"Fetched page {page}/{paging.total_pages}, got {len(messages)} messages, total: {total_fetched}")
+        all_messages = [message for response in pages for message in response["messages"]]
+        if max_messages:
+            all_messages = all_messages[:max_messages]
+        tech = pages[-1]["tech"]
 
-            # Check if we've reached the max or all pages
-            if max_messages and total_fetched >= max_messages:
-                all_messages = all_messages[:max_messages]
-                break
-
-            if page >= paging.total_pages:
-                break
-
-            page += 1
+        logger.info(
+            f"Fetched {len(pages)}/{first['paging'].total_pages} pages, {len(all_messages)} messages for user {user_id}"
+        )
 
         message_analyzer = MessageAnalyzer()
         message_analysis_result = message_analyzer.analyze_conversation(
@@ -233,6 +475,110 @@ class FunstatService:
             "tech": tech
         }
 
+    async def stream_all_user_messages(
+        self,
+        user_id: int,
+        group_id: Optional[int] = None,
+        text_contains: Optional[str] = None,
+        media_code: Optional[int] = None,
+        max_messages: Optional[int] = None,
+        include_messages: bool = True
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        get_all_user_messages as a stream of records, for NDJSON/SSE.
+
+        Pages are analysed as they arrive and emitted in order: "started"
+        after page 1, one "page" per page with its messages (unless
+        include_messages is false) and the analyses of its sensitive
+        messages, then "summary" with the conversation-level analysis.
+        Only the fetch window and the aggregated findings are kept in
+        memory, however long the history is. A failure ends the stream with
+        an "error" record, since the response has already started.
+        """
+        page_size = 100
+        conversation = ConversationAccumulator(MessageAnalyzer())
+        emitted = 0
+
+        async def fetch_page(page: int) -> Dict[str, Any]:
+            return await self.get_user_messages(
+                user_id=user_id,
+                page=page,
+                page_size=page_size,
+                group_id=group_id,
+                text_contains=text_contains,
+                media_code=media_code
+            )
+
+        def analyze_page(messages: List[Dict]) -> List[Dict]:
+            return [
+                analysis for analysis in map(conversation.add, messages)
+                if analysis is not None
+            ]
+
+        async def page_record(page: int, response: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal emitted
+            messages = response["messages"]
+            if max_messages:
+                messages = messages[:max_messages - emitted]
+            emitted += len(messages)
+            messages = [msg.model_dump(by_alias=True, mode="json") for msg in messages]
+            # The regex analysis is CPU-bound; keep it off the event loop
+            analyses = await asyncio.to_thread(analyze_page, messages)
+
+            record = {
+                "type": "page",
+                "page": page,
+                "message_analyses": analyses,
+                "progress": {
+                    "pages_done": page,
+                    "pages_to_fetch": last_page,
+                    "messages": emitted,
+                    "messages_with_sensitive_data": conversation.messages_with_sensitive_data,
+                },
+            }
+            if include_messages:
+                record["messages"] = messages
+            return record
+
+        try:
+            first = await fetch_page(1)
+            paging = first["paging"]
+            last_page = max(paging.total_pages, 1)
+            if max_messages:
+                last_page = min(last_page, -(-max_messages // page_size))
+            yield {
+                "type": "started",
+                "user_id": user_id,
+                "total_messages": paging.total,
+                "total_pages": paging.total_pages,
+                "pages_to_fetch": last_page,
+            }
+
+            yield await page_record(1, first)
+            tech = first["tech"]
+
+            remaining = self._iter_pages(fetch_page, range(2, last_page + 1))
+            try:
+                page = 1
+                async for response in remaining:
+                    page += 1
+                    tech = response["tech"]
+                    yield await page_record(page, response)
+            finally:
+                await remaining.aclose()
+
+            yield {
+                "type": "summary",
+                "total": emitted,
+                "messages_analysis": conversation.result(),
+                "tech": tech.model_dump(by_alias=True),
+            }
+        except HTTPException as e:
+            yield {"type": "error", "status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            logger.error(f"Streaming messages for user {user_id} failed: {e}")
+            yield {"type": "error", "status_code": 500, "detail": str(e)}
+
     async def get_user_names_history(self, user_id: int) -> List[UserNamesHistory]:
         """User (firstname + lastname) history COST: 3"""
         response = await self._make_request(
@@ -1501,114 +1847,13 @@ class MessageAnalyzer:
         Returns:
             Conversation-level analysis (only includes messages with sensitive data)
         """
-        total_messages = len(messages)
-        messages_with_sensitive_data = 0
-
-        risk_summary = {
-            "critical": 0,
-            "high": 0,
-            "medium": 0,
-            "low": 0,
-            "example": 0,
-        }
-        data_type_frequency = {}
-
+        conversation = ConversationAccumulator(self)
         analyzed_messages = []
-        all_extracted_data = {}
-
         for msg in messages:
-            text = msg.get("text", "")
-            if not text:
-                continue
-
-            msg_analysis = self.analyze_message(text, extended=True)
-
-            if not msg_analysis.get("has_sensitive_data"):
-                continue
-
-            messages_with_sensitive_data += 1
-
-            # Build message analysis object
-            message_obj = {
-                "has_sensitive_data": True,
-                "extracted_data": msg_analysis.get("extracted_data", {}),
-                "data_types_found": msg_analysis.get("data_types_found", []),
-                "risk_score": msg_analysis.get("risk_score", 0),
-                "risk_level": msg_analysis.get("risk_level", "low"),
-                "message_id": msg.get("messageId"),
-                "date": msg.get("date"),
-                "text": text,
-            }
-
-            # Add optional fields if present
-            if "intent" in msg_analysis:
-                message_obj["intent"] = msg_analysis["intent"]
-            if "scam_patterns" in msg_analysis:
-                message_obj["scam_patterns"] = msg_analysis["scam_patterns"]
-            if "warnings" in msg_analysis:
-                message_obj["warnings"] = msg_analysis["warnings"]
-
-            # Add group info if available
-            if "group" in msg:
-                message_obj["group"] = msg["group"]
-
-            analyzed_messages.append(message_obj)
-
-            # Update risk summary
-            risk_level = msg_analysis.get("risk_level", "low")
-            risk_summary[risk_level] += 1
-
-            # Aggregate data
-            extracted = msg_analysis.get("extracted_data", {})
-            for data_type, items in extracted.items():
-                if data_type not in all_extracted_data:
-                    all_extracted_data[data_type] = set()
-                all_extracted_data[data_type].update(items)
-
-                data_type_frequency[data_type] = data_type_frequency.get(data_type, 0) + 1
-
-        if messages_with_sensitive_data == 0:
-            return {
-                "has_sensitive_data": False,
-                "total_messages": total_messages,
-                "messages_with_sensitive_data": 0
-            }
-
-        # Convert sets to lists for JSON serialization
-        aggregated_data_list = {k: list(v) for k, v in all_extracted_data.items()}
-
-        # Calculate overall conversation risk
-        overall_risk = self._calculate_conversation_risk({
-            "total_messages": total_messages,
-            "messages_with_sensitive_data": messages_with_sensitive_data,
-            "risk_summary": risk_summary,
-            "aggregated_data": aggregated_data_list,
-        })
-
-        conversation_analysis = {
-            "has_sensitive_data": True,
-            "total_messages": total_messages,
-            "messages_with_sensitive_data": messages_with_sensitive_data,
-            "aggregated_data": aggregated_data_list,
-            "risk_summary": risk_summary,
-            "data_type_frequency": data_type_frequency,
-            "overall_risk_score": overall_risk,
-        }
-
-        # Add overall risk level
-        if overall_risk >= 70:
-            conversation_analysis["overall_risk_level"] = "critical"
-        elif overall_risk >= 50:
-            conversation_analysis["overall_risk_level"] = "high"
-        elif overall_risk >= 25:
-            conversation_analysis["overall_risk_level"] = "medium"
-        else:
-            conversation_analysis["overall_risk_level"] = "low"
-
-        if include_message_analysis and analyzed_messages:
-            conversation_analysis["message_analyses"] = analyzed_messages
-
-        return conversation_analysis
+            message_obj = conversation.add(msg)
+            if message_obj is not None and include_message_analysis:
+                analyzed_messages.append(message_obj)
+        return conversation.result(analyzed_messages)
 
     def _calculate_conversation_risk(self, conv_analysis: Dict) -> int:
         """
@@ -1722,3 +1967,125 @@ class MessageAnalyzer:
             user_analysis["risk_assessment"] = "medium"
 
         return user_analysis
+
+
+class ConversationAccumulator:
+    """
+    analyze_conversation one message at a time.
+
+    Keeps only the counters and the aggregated extracted values, so a
+    conversation can be analysed page by page as it streams in; add()
+    returns the per-message analysis for the caller to emit or collect.
+    """
+
+    def __init__(self, analyzer: MessageAnalyzer):
+        self.analyzer = analyzer
+        self.total_messages = 0
+        self.messages_with_sensitive_data = 0
+        self.risk_summary = {
+            "critical": 0,
+            "high": 0,
+            "medium": 0,
+            "low": 0,
+            "example": 0,
+        }
+        self.data_type_frequency: Dict[str, int] = {}
+        self.all_extracted_data: Dict[str, set] = {}
+
+    def add(self, msg: Dict) -> Optional[Dict]:
+        """Analyse one message dict ('text', 'messageId', ...); the analysis if it has sensitive data"""
+        self.total_messages += 1
+        text = msg.get("text", "")
+        if not text:
+            return None
+
+        msg_analysis = self.analyzer.analyze_message(text, extended=True)
+
+        if not msg_analysis.get("has_sensitive_data"):
+            return None
+
+        self.messages_with_sensitive_data += 1
+
+        # Build message analysis object
+        message_obj = {
+            "has_sensitive_data": True,
+            "extracted_data": msg_analysis.get("extracted_data", {}),
+            "data_types_found": msg_analysis.get("data_types_found", []),
+            "risk_score": msg_analysis.get("risk_score", 0),
+            "risk_level": msg_analysis.get("risk_level", "low"),
+            "message_id": msg.get("messageId"),
+            "date": msg.get("date"),
+            "text": text,
+        }
+
+        # Add optional fields if present
+        if "intent" in msg_analysis:
+            message_obj["intent"] = msg_analysis["intent"]
+        if "scam_patterns" in msg_analysis:
+            message_obj["scam_patterns"] = msg_analysis["scam_patterns"]
+        if "warnings" in msg_analysis:
+            message_obj["warnings"] = msg_analysis["warnings"]
+
+        # Add group info if available
+        if "group" in msg:
+            message_obj["group"] = msg["group"]
+
+        # Update risk summary
+        risk_level = msg_analysis.get("risk_level", "low")
+        self.risk_summary[risk_level] += 1
+
+        # Aggregate data
+        extracted = msg_analysis.get("extracted_data", {})
+        for data_type, items in extracted.items():
+            if data_type not in self.all_extracted_data:
+                self.all_extracted_data[data_type] = set()
+            self.all_extracted_data[data_type].update(items)
+
+            self.data_type_frequency[data_type] = self.data_type_frequency.get(data_type, 0) + 1
+
+        return message_obj
+
+    def result(self, message_analyses: Optional[List[Dict]] = None) -> Dict:
+        """Conversation-level analysis so far; message_analyses are attached when given"""
+        if self.messages_with_sensitive_data == 0:
+            return {
+                "has_sensitive_data": False,
+                "total_messages": self.total_messages,
+                "messages_with_sensitive_data": 0
+            }
+
+        # Convert sets to lists for JSON serialization
+        aggregated_data_list = {k: list(v) for k, v in self.all_extracted_data.items()}
+
+        # Calculate overall conversation risk
+        overall_risk = self.analyzer._calculate_conversation_risk({
+            "total_messages": self.total_messages,
+            "messages_with_sensitive_data": self.messages_with_sensitive_data,
+            "risk_summary": self.risk_summary,
+            "aggregated_data": aggregated_data_list,
+        })
+
+        conversation_analysis = {
+            "has_sensitive_data": True,
+            "total_messages": self.total_messages,
+            "messages_with_sensitive_data": self.messages_with_sensitive_data,
+            "aggregated_data": aggregated_data_list,
+            "risk_summary": dict(self.risk_summary),
+            "data_type_frequency": dict(self.data_type_frequency),
+            "overall_risk_score": overall_risk,
+        }
+
+        # Add overall risk level
+        if overall_risk >= 70:
+            conversation_analysis["overall_risk_level"] = "critical"
+        elif overall_risk >= 50:
+            conversation_analysis["overall_risk_level"] = "high"
+        elif overall_risk >= 25:
+            conversation_analysis["overall_risk_level"] = "medium"
+        else:
+            conversation_analysis["overall_risk_level"] = "low"
+
+        if message_analyses:
+            conversation_analysis["message_analyses"] = message_analyses
+
+        return conversation_analysis
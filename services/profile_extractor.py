@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Bodies above this are hashed in a thread rather than on the event loop
+_INLINE_HASH_LIMIT = 64 * 1024
+
+try:
+    from socid_extractor import extract
+except ImportError:
+    extract = None
+    logger.warning("socid_extractor not installed. Profile extraction disabled.")
+
+
+def parse_embedded_json(text: str) -> Optional[dict]:
+    """Parse text as a JSON object, or the first balanced {...} block inside it"""
+    try:
+        text = text.strip()
+
+        if text.startswith(('{', '[')):
+            data = json.loads(text)
+            if isinstance(data, dict):
+                return data
+
+        brace_start = text.find('{')
+        if brace_start != -1:
+            brace_count = 0
+            for i in range(brace_start, len(text)):
+                if text[i] == '{':
+                    brace_count += 1
+                elif text[i] == '}':
+                    brace_count -= 1
+                    if brace_count == 0:
+                        json_str = text[brace_start:i+1]
+                        data = json.loads(json_str)
+                        if isinstance(data, dict):
+                            return data
+                        break
+    except (json.JSONDecodeError, ValueError):
+        pass
+    return None
+
+
+def extract_profile(text: str) -> Optional[dict]:
+    """socid_extractor first, embedded JSON as a fallback. Runs inside a worker"""
+    profile_data = None
+    if extract:
+        try:
+            profile_data = extract(text)
+        except Exception as e:
+            logger.debug(f"socid_extractor failed: {e}")
+    if not profile_data:
+        profile_data = parse_embedded_json(text)
+    return profile_data or None
+
+
+class ProfileExtractor:
+    """
+    Bounded extraction stage for FOUND pages.
+
+    socid_extractor and the JSON fallback are regex and scan heavy, so they run
+    in a small process pool instead of on the event loop or the default thread
+    pool. At most max_pending pages are queued or running; further callers wait
+    for a slot, which pushes back on the search producing them. Each page gets
+    timeout_seconds, and results are cached by content hash so identical pages
+    (error templates, shared landing pages) are parsed once.
+
+    workers=0 runs extraction in a thread instead of a process pool.
+    """
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 max_pending: int = 64,
+                 timeout_seconds: float = 5.0,
+                 cache_size: int = 2048):
+        self.workers = min(4, os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self.cache_size = cache_size
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+        self._cache: "OrderedDict[bytes, Optional[dict]]" = OrderedDict()
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        self._latencies = deque(maxlen=512)
+        self._stuck: Set[Future] = set()
+
+        self.waiting = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.pool_restarts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: the parent runs an event loop and threads, which fork does not copy safely
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _recycle_pool(self, reason: str):
+        executor, self._executor = self._executor, None
+        self._stuck.clear()
+        if executor is not None:
+            # Queued pages keep their own timeouts; stuck workers exit when they finish
+            executor.shutdown(wait=False)
+            self.pool_restarts += 1
+            logger.warning(f"Restarting profile extraction pool: {reason}")
+
+    @staticmethod
+    def _content_key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _remember(self, key: bytes, profile_data: Optional[dict]):
+        self._cache[key] = profile_data
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def extract(self, text: str, url: Optional[str] = None) -> Optional[dict]:
+        """Profile data for a page, or None if nothing could be extracted"""
+        if not text:
+            return None
+
+        if len(text) > _INLINE_HASH_LIMIT:
+            key = await asyncio.to_thread(self._content_key, text)
+        else:
+            key = self._content_key(text)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return self._cache[key]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.cache_hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            profile_data = await self._run(text, url)
+            self._remember(key, profile_data)
+            future.set_result(profile_data)
+            return profile_data
+        except BaseException:
+            future.set_result(None)
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _run(self, text: str, url: Optional[str]) -> Optional[dict]:
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.submitted += 1
+        self.running += 1
+        start = time.perf_counter()
+        job = None
+        try:
+            if self.workers <= 0:
+                call = asyncio.to_thread(extract_profile, text)
+            else:
+                job = self._get_executor().submit(extract_profile, text)
+                call = asyncio.wrap_future(job)
+            profile_data = await asyncio.wait_for(call, timeout=self.timeout_seconds)
+            self.completed += 1
+            return profile_data
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.debug(f"Profile extraction timed out for {url}")
+            if job is not None and job.running():
+                # The worker is still busy with this page; once every worker is, start over
+                self._stuck.add(job)
+                job.add_done_callback(self._stuck.discard)
+                if len(self._stuck) >= self.workers:
+                    self._recycle_pool("all workers timed out")
+            return None
+        except BrokenProcessPool:
+            self.errors += 1
+            self._recycle_pool("worker process died")
+            return None
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"Profile extraction failed for {url}: {e}")
+            return None
+        finally:
+            self._latencies.append(time.perf_counter() - start)
+            self.running -= 1
+            self._slots.release()
+
+    async def start(self):
+        """Spawn the workers up front so the first FOUND page does not pay for it"""
+        if self.workers <= 0:
+            return
+        executor = self._get_executor()
+        await asyncio.gather(*[
+            asyncio.wrap_future(executor.submit(extract_profile, ""))
+            for _ in range(self.workers)
+        ])
+
+    async def stop(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        ordered = sorted(self._latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+        return {
+            "backend": "process" if self.workers > 0 else "thread",
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self._cache),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "pool_restarts": self.pool_restarts,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import statistics
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_PATH = Path(__file__).parent.parent / "cache" / "site_latency.json"
+
+
+class _SiteLatency:
+    """Rolling latency window and timeout rate for one site"""
+    __slots__ = ("samples", "timeout_rate", "attempts")
+
+    def __init__(self, window: int, samples: Iterable[float] = (), timeout_rate: float = 0.0, attempts: int = 0):
+        self.samples = deque(samples, maxlen=window)
+        self.timeout_rate = timeout_rate
+        self.attempts = attempts
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        return {
+            "samples": [round(s, 4) for s in self.samples],
+            "timeout_rate": round(self.timeout_rate, 4),
+            "attempts": self.attempts,
+        }
+
+
+class SiteLatencyProfile:
+    """
+    Per-site response time and timeout history used to schedule checks.
+
+    Kept in memory and snapshotted to disk periodically so a restart keeps
+    its knowledge. Sites are ordered by expected cost (median latency plus a
+    timeout penalty) and chronically slow sites get a tighter time budget.
+    """
+
+    def __init__(self,
+                 path: Path = DEFAULT_PROFILE_PATH,
+                 window: int = 32,
+                 alpha: float = 0.2,
+                 min_samples: int = 5,
+                 snapshot_interval: float = 300):
+        self.path = Path(path)
+        self.window = window
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.snapshot_interval = snapshot_interval
+        self._sites: Dict[str, _SiteLatency] = {}
+        self._dirty = False
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    # ── recording ───────────────────────────────────────────────
+
+    def record(self, site_name: str, latency: Optional[float], timed_out: bool = False):
+        """Record one attempt against a site"""
+        if latency is None:
+            return
+        stats = self._sites.get(site_name)
+        if stats is None:
+            stats = self._sites[site_name] = _SiteLatency(self.window)
+        stats.attempts += 1
+        stats.timeout_rate += self.alpha * ((1.0 if timed_out else 0.0) - stats.timeout_rate)
+        if not timed_out:
+            stats.samples.append(latency)
+        self._dirty = True
+
+    # ── scheduling ──────────────────────────────────────────────
+
+    def p95(self, site_name: str) -> Optional[float]:
+        stats = self._sites.get(site_name)
+        if stats is None or len(stats.samples) < self.min_samples:
+            return None
+        return stats.percentile(0.95)
+
+    def expected_cost(self, site_name: str, default_timeout: float) -> Optional[float]:
+        """Median latency plus the expected time lost to timeouts; None if unknown"""
+        stats = self._sites.get(site_name)
+        if stats is None or stats.attempts < self.min_samples:
+            return None
+        median = stats.percentile(0.5)
+        if median is None:
+            median = default_timeout
+        return median + stats.timeout_rate * default_timeout
+
+    def order(self, plans: List, default_timeout: float) -> List:
+        """
+        Fast, reliable sites first; chronically slow ones last.
+        Sites without history are placed at the median known cost.
+        """
+        costs = {plan.name: self.expected_cost(plan.name, default_timeout) for plan in plans}
+        known = [cost for cost in costs.values() if cost is not None]
+        if not known:
+            return list(plans)
+        unknown_cost = statistics.median(known)
+        return sorted(plans, key=lambda plan: costs[plan.name] if costs[plan.name] is not None else unknown_cost)
+
+    def timeout_for(self, site_name: str, default_timeout: float, floor: float = 3.0) -> float:
+        """
+        Time budget for one attempt.
+
+        Sites that usually time out get half the default budget. Sites with a
+        stable history get four times their p95, but never less than floor and
+        never more than the default.
+        """
+        stats = self._sites.get(site_name)
+        if stats is None or stats.attempts < self.min_samples:
+            return default_timeout
+        if stats.timeout_rate >= 0.5:
+            return max(floor, default_timeout / 2)
+        p95 = stats.percentile(0.95)
+        if p95 is None:
+            return default_timeout
+        return min(default_timeout, max(floor, p95 * 4))
+
+    def site_state(self, site_name: Optional[str] = None) -> dict:
+        names = [site_name] if site_name else list(self._sites)
+        return {
+            name: {
+                **self._sites[name].to_dict(),
+                "p50": self._sites[name].percentile(0.5),
+                "p95": self._sites[name].percentile(0.95),
+            }
+            for name in names if name in self._sites
+        }
+
+    # ── persistence ─────────────────────────────────────────────
+
+    async def start(self):
+        """Load the last snapshot and start periodic snapshots"""
+        await self.load()
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+
+    async def load(self):
+        """Load the last snapshot without scheduling snapshots (read-only copies in other processes)"""
+        await asyncio.to_thread(self._load)
+
+    async def stop(self):
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+        await self.save()
+
+    async def save(self):
+        if not self._dirty:
+            return
+        payload = json.dumps({name: stats.to_dict() for name, stats in self._sites.items()})
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, payload)
+        except OSError as e:
+            self._dirty = True
+            logger.warning(f"Failed to save site latency profile: {e}")
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.save()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable site latency profile {self.path}: {e}")
+            return
+        for name, entry in data.items():
+            self._sites[name] = _SiteLatency(
+                self.window,
+                entry.get("samples", []),
+                entry.get("timeout_rate", 0.0),
+                entry.get("attempts", 0)
+            )
+        logger.info(f"Loaded latency profile for {len(self._sites)} sites")
+
+    def _write(self, payload: str):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(payload)
+        os.replace(tmp_path, self.path)
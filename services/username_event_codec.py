@@ -0,0 +1,61 @@
+import json
+import logging
+from enum import Enum
+from typing import Iterable, List, Optional
+
+from services.username_service import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _default(value):
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def available_encodings() -> List[str]:
+    return ["json", "msgpack"] if msgpack else ["json"]
+
+
+def compact_event(event: StreamEvent) -> list:
+    """[event_type, data, timestamp]; no asdict copy or enum walk"""
+    return [event.event_type.value, event.data, event.timestamp]
+
+
+def encode_frame(payload: dict, encoding: str = "json") -> bytes:
+    if encoding == "msgpack":
+        return msgpack.packb(payload, default=_default)
+    if orjson:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def encode_events(events: Iterable[StreamEvent], encoding: str = "json") -> bytes:
+    """One binary frame for a whole batch: {"type": "events", "events": [[type, data, ts], ...]}"""
+    return encode_frame({"type": "events", "events": [compact_event(e) for e in events]}, encoding)
+
+
+def decode_frame(data, encoding: str = "json") -> Optional[dict]:
+    """Client message from a text or binary frame; None if it is not an object"""
+    try:
+        if isinstance(data, (bytes, bytearray)) and encoding == "msgpack":
+            message = msgpack.unpackb(data)
+        elif orjson:
+            message = orjson.loads(data)
+        else:
+            message = json.loads(data)
+    except Exception as e:
+        logger.debug(f"Undecodable websocket message: {e}")
+        return None
+    return message if isinstance(message, dict) else None
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from fastapi import HTTPException
+
+from services.username_search_jobs import JobStatus
+from services.username_service import CheckStatus, EventType, StreamingUsernameSearchService, dumps_json
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    PARQUET_AVAILABLE = False
+
+EXPORT_FORMATS = ("ndjson", "parquet")
+
+# One row per site result; profile_data is a JSON string in Parquet
+ROW_FIELDS = (
+    "username", "site_name", "category", "url", "status", "status_code",
+    "response_time", "checked_at", "cached", "error_message", "profile_data"
+)
+
+if PARQUET_AVAILABLE:
+    PARQUET_SCHEMA = pa.schema([
+        ("username", pa.string()),
+        ("site_name", pa.string()),
+        ("category", pa.string()),
+        ("url", pa.string()),
+        ("status", pa.string()),
+        ("status_code", pa.int32()),
+        ("response_time", pa.float64()),
+        ("checked_at", pa.string()),
+        ("cached", pa.bool_()),
+        ("error_message", pa.string()),
+        ("profile_data", pa.string()),
+    ])
+
+
+def parse_usernames(text: str) -> List[str]:
+    """
+    Usernames from an uploaded list: one per line, or the first column of a
+    CSV. Blank lines, # comments, a "username" header and a leading @ are
+    dropped; duplicates keep their first position.
+    """
+    usernames = []
+    for line in text.splitlines():
+        value = line.split(",", 1)[0].strip().strip('"').lstrip("@").strip()
+        if not value or value.startswith("#") or value.lower() == "username":
+            continue
+        usernames.append(value)
+    return list(dict.fromkeys(usernames))
+
+
+class _NDJSONWriter:
+    def __init__(self, path: Path):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: List[dict]):
+        if rows:
+            self._file.write("".join(dumps_json(row) + "\n" for row in rows))
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Buffers rows into row groups; the file is readable once closed"""
+
+    def __init__(self, path: Path, row_group_size: int = 10000):
+        self.row_group_size = row_group_size
+        self._writer = pq.ParquetWriter(str(path), PARQUET_SCHEMA)
+        self._pending: List[dict] = []
+
+    def write(self, rows: List[dict]):
+        for row in rows:
+            if row["profile_data"] is not None:
+                row = {**row, "profile_data": json.dumps(row["profile_data"], default=str)}
+            self._pending.append(row)
+        if len(self._pending) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_table(pa.Table.from_pylist(self._pending, schema=PARQUET_SCHEMA))
+            self._pending = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def _open_writer(export_format: str, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if export_format == "parquet":
+        return _ParquetWriter(path)
+    return _NDJSONWriter(path)
+
+
+class ExportJob:
+    """Progress of one bulk username export; results go to path as each username finishes"""
+
+    def __init__(self, export_id: str, usernames: List[str], export_format: str,
+                 found_only: bool, sharded: bool, params: dict, path: Path):
+        self.export_id = export_id
+        self.usernames = usernames
+        self.format = export_format
+        self.found_only = found_only
+        self.sharded = sharded
+        self.params = params
+        self.path = path
+        self.status = JobStatus.RUNNING
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.in_progress: Set[str] = set()
+        self.completed = 0
+        self.failed = 0
+        self.found = 0
+        self.sites_checked = 0
+        self.site_errors = 0
+        self.rows_written = 0
+        self.errors = deque(maxlen=20)
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.write_lock = asyncio.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status != JobStatus.RUNNING
+
+    def finish(self, status: JobStatus, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+    def summary(self) -> dict:
+        processed = self.completed + self.failed
+        total = len(self.usernames)
+        elapsed = (self.finished_at or time.time()) - self.created_at
+        eta = None
+        if not self.done and processed:
+            eta = round(elapsed / processed * (total - processed), 1)
+        return {
+            "export_id": self.export_id,
+            "status": self.status.value,
+            "format": self.format,
+            "found_only": self.found_only,
+            "sharded": self.sharded,
+            "params": self.params,
+            "total_usernames": total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_progress": sorted(self.in_progress),
+            "percentage": round(processed / total * 100, 2) if total else 100.0,
+            "found": self.found,
+            "sites_checked": self.sites_checked,
+            "site_errors": self.site_errors,
+            "rows_written": self.rows_written,
+            "file": self.path.name,
+            "report_url": f"/reports/{self.path.name}",
+            "bytes_written": self.path.stat().st_size if self.path.exists() else 0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+            "errors": list(self.errors),
+            "error": self.error,
+        }
+
+
+class ExportJobManager:
+    """
+    Bulk username exports that run without a client attached.
+
+    Each job searches its usernames with the regular engine and appends the
+    site results to reports/username-export-<id>.<format> as each username
+    completes; clients poll the job for progress. At most
+    max_concurrent_searches usernames are searched at once across all export
+    jobs, so overnight runs do not starve interactive searches. NDJSON is
+    readable while the job runs; Parquet (needs pyarrow) once it finishes.
+    """
+
+    def __init__(self,
+                 service: StreamingUsernameSearchService,
+                 shard_pool=None,
+                 reports_dir: str = "reports",
+                 max_concurrent_searches: int = 4,
+                 max_usernames: int = 20000,
+                 max_jobs: int = 50):
+        self.service = service
+        self.shard_pool = shard_pool
+        self.reports_dir = Path(reports_dir)
+        self.max_concurrent_searches = max_concurrent_searches
+        self.max_usernames = max_usernames
+        self.max_jobs = max_jobs
+        self._slots = asyncio.Semaphore(max_concurrent_searches)
+        self._jobs: Dict[str, ExportJob] = {}
+
+    def create(self,
+               usernames: List[str],
+               export_format: str = "ndjson",
+               found_only: bool = True,
+               sharded: bool = False,
+               **params) -> ExportJob:
+        """Start an export; raises 400 on bad input and 429 when max_jobs are running"""
+        usernames = list(dict.fromkeys(u.strip() for u in usernames if u and u.strip()))
+        if not usernames:
+            raise HTTPException(status_code=400, detail="No usernames to export")
+        if len(usernames) > self.max_usernames:
+            raise HTTPException(status_code=400, detail=f"At most {self.max_usernames} usernames per export")
+        if export_format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown export format {export_format!r}")
+        if export_format == "parquet" and not PARQUET_AVAILABLE:
+            raise HTTPException(status_code=400, detail="Parquet export needs pyarrow (pip install pyarrow)")
+        if sharded and not (self.shard_pool and self.shard_pool.started):
+            raise HTTPException(status_code=400, detail="Sharded search is not enabled (USERNAME_SEARCH_SHARDS)")
+        if len(self._jobs) >= self.max_jobs:
+            self._evict_finished(len(self._jobs) - self.max_jobs + 1)
+            if len(self._jobs) >= self.max_jobs:
+                raise HTTPException(status_code=429, detail="Too many running exports, retry later")
+
+        export_id = str(uuid.uuid4())
+        job = ExportJob(
+            export_id, usernames, export_format, found_only, sharded, params,
+            self.reports_dir / f"username-export-{export_id}.{export_format}"
+        )
+        self._jobs[export_id] = job
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Export {export_id} started: {len(usernames)} usernames to {job.path}")
+        return job
+
+    def get(self, export_id: str) -> ExportJob:
+        job = self._jobs.get(export_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Export {export_id} not found")
+        return job
+
+    async def cancel(self, export_id: str) -> ExportJob:
+        job = self.get(export_id)
+        if job.task and not job.task.done():
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+        return job
+
+    async def stop(self):
+        for job in list(self._jobs.values()):
+            await self.cancel(job.export_id)
+
+    async def _run(self, job: ExportJob):
+        usernames = iter(job.usernames)
+        workers: List[asyncio.Task] = []
+        writer = None
+        try:
+            writer = await asyncio.to_thread(_open_writer, job.format, job.path)
+            session = None if job.sharded else self.service.create_session()
+            try:
+                workers = [
+                    asyncio.create_task(self._worker(job, usernames, writer, session))
+                    for _ in range(min(self.max_concurrent_searches, len(job.usernames)))
+                ]
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                if session is not None:
+                    await session.close()
+        except asyncio.CancelledError:
+            job.finish(JobStatus.CANCELLED)
+            raise
+        except Exception as e:
+            logger.error(f"Export {job.export_id} failed: {e}")
+            job.finish(JobStatus.FAILED, str(e))
+        else:
+            job.finish(JobStatus.COMPLETED)
+            logger.info(
+                f"Export {job.export_id} finished: {job.completed} usernames, "
+                f"{job.failed} failed, {job.rows_written} rows"
+            )
+        finally:
+            if writer is not None:
+                await asyncio.to_thread(writer.close)
+
+    async def _worker(self, job: ExportJob, usernames: Iterator[str], writer, session):
+        for username in usernames:
+            async with self._slots:
+                job.in_progress.add(username)
+                try:
+                    rows, completed = await self._search(job, username, session)
+                except Exception as e:
+                    logger.warning(f"Export {job.export_id}: search for {username} failed: {e}")
+                    job.failed += 1
+                    job.errors.append({"username": username, "message": str(e)})
+                    continue
+                finally:
+                    job.in_progress.discard(username)
+
+            async with job.write_lock:
+                await asyncio.to_thread(writer.write, rows)
+            job.rows_written += len(rows)
+            job.completed += 1
+            job.found += completed.get("total_found", 0)
+            job.sites_checked += completed.get("total_checked", 0)
+            job.site_errors += completed.get("total_errors", 0)
+
+    async def _search(self, job: ExportJob, username: str, session):
+        """Site result rows and the SEARCH_COMPLETED summary for one username"""
+        params = dict(job.params)
+        if job.sharded:
+            source = self.shard_pool
+        else:
+            source = self.service
+            params["shared_session"] = session
+
+        found = CheckStatus.FOUND.value
+        rows = []
+        completed = None
+        async for batch in source.stream_search_batches(username=username, **params):
+            for event in batch:
+                if event.event_type == EventType.SITE_RESULT:
+                    data = event.data
+                    if job.found_only and data.get("status") != found:
+                        continue
+                    rows.append({
+                        "username": username,
+                        **{field: data.get(field) for field in ROW_FIELDS[1:]}
+                    })
+                elif event.event_type == EventType.SEARCH_COMPLETED:
+                    completed = event.data
+        if completed is None:
+            raise RuntimeError("search ended without completing")
+        return rows, completed
+
+    def _evict_finished(self, count: int):
+        finished = sorted(
+            (job for job in self._jobs.values() if job.done),
+            key=lambda job: job.finished_at
+        )
+        for job in finished[:count]:
+            del self._jobs[job.export_id]
+
+    def stats(self) -> dict:
+        return {
+            "exports": [job.summary() for job in self._jobs.values()],
+            "running": sum(1 for job in self._jobs.values() if not job.done),
+            "searching": sum(len(job.in_progress) for job in self._jobs.values()),
+            "max_concurrent_searches": self.max_concurrent_searches,
+            "max_usernames": self.max_usernames,
+            "parquet_available": PARQUET_AVAILABLE,
+        }
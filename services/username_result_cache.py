@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent / "cache" / "username_results.sqlite3"
+
+# Seconds a cached result stays valid, per result class
+DEFAULT_TTLS = {
+    "found": 24 * 3600,
+    "not_found": 6 * 3600,
+    "error": 10 * 60,
+}
+
+
+def result_class(status: str) -> str:
+    """Map a CheckStatus value onto its TTL class"""
+    if status in ("found", "not_found"):
+        return status
+    return "error"
+
+
+@dataclass
+class CachedResult:
+    """A stored SiteResult payload"""
+    payload: dict
+    stored_at: float
+
+    @property
+    def result_class(self) -> str:
+        return result_class(self.payload.get("status", "error"))
+
+
+class SiteResultCache:
+    """
+    (site, username) -> SiteResult cache with per-class TTLs and an LRU bound.
+    Subclasses provide storage; expiry is evaluated at read time so TTL changes
+    apply to entries already stored.
+    """
+
+    def __init__(self, max_entries: int = 200_000, ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, entry: CachedResult, now: float) -> bool:
+        return now - entry.stored_at < self.ttls.get(entry.result_class, 0)
+
+    async def get_many(self, username: str, site_names: Iterable[str]) -> Dict[str, CachedResult]:
+        """Fresh entries for the given sites, keyed by site name"""
+        raise NotImplementedError
+
+    async def put(self, site_name: str, username: str, payload: dict):
+        raise NotImplementedError
+
+    async def flush(self):
+        """Persist buffered writes, if the backend buffers"""
+
+    async def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "ttls": self.ttls,
+            "max_entries": self.max_entries,
+        }
+
+
+class MemoryResultCache(SiteResultCache):
+    """In-process LRU; lost on restart"""
+
+    def __init__(self, max_entries: int = 200_000, ttls: Optional[Dict[str, float]] = None):
+        super().__init__(max_entries, ttls)
+        self._entries: "OrderedDict[Tuple[str, str], CachedResult]" = OrderedDict()
+
+    async def get_many(self, username: str, site_names: Iterable[str]) -> Dict[str, CachedResult]:
+        now = time.time()
+        found = {}
+        for site_name in site_names:
+            key = (site_name, username)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                continue
+            if not self._is_fresh(entry, now):
+                del self._entries[key]
+                self.misses += 1
+                continue
+            self._entries.move_to_end(key)
+            found[site_name] = entry
+            self.hits += 1
+        return found
+
+    async def put(self, site_name: str, username: str, payload: dict):
+        key = (site_name, username)
+        self._entries[key] = CachedResult(payload=payload, stored_at=time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "memory", "entries": len(self._entries)}
+
+
+class SQLiteResultCache(SiteResultCache):
+    """
+    SQLite-backed cache that survives restarts.
+
+    Reads are one query per search; writes are buffered and committed in batches.
+    All database work runs in a worker thread.
+    """
+
+    def __init__(self,
+                 path: Path = DEFAULT_DB_PATH,
+                 max_entries: int = 200_000,
+                 ttls: Optional[Dict[str, float]] = None,
+                 flush_threshold: int = 200):
+        super().__init__(max_entries, ttls)
+        self.path = Path(path)
+        self.flush_threshold = flush_threshold
+        self._pending: List[Tuple[str, str, str, str, float, float]] = []
+        self._db_lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS site_results (
+                    site TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (username, site)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_site_results_accessed ON site_results (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _select(self, username: str, site_names: List[str]) -> List[Tuple[str, str, float]]:
+        with self._db_lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT site, payload, stored_at FROM site_results WHERE username = ?",
+                (username,)
+            ).fetchall()
+            wanted = set(site_names)
+            rows = [row for row in rows if row[0] in wanted]
+            if rows:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE site_results SET accessed_at = ? WHERE site = ? AND username = ?",
+                    [(now, row[0], username) for row in rows]
+                )
+                conn.commit()
+            return rows
+
+    def _write(self, rows: List[Tuple[str, str, str, str, float, float]]):
+        with self._db_lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO site_results "
+                "(site, username, status, payload, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            count = conn.execute("SELECT COUNT(*) FROM site_results").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM site_results WHERE rowid IN "
+                    "(SELECT rowid FROM site_results ORDER BY accessed_at LIMIT ?)",
+                    (excess,)
+                )
+            conn.commit()
+
+    def _delete_all(self):
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM site_results")
+            conn.commit()
+
+    async def get_many(self, username: str, site_names: Iterable[str]) -> Dict[str, CachedResult]:
+        site_names = list(site_names)
+        try:
+            rows = await asyncio.to_thread(self._select, username, site_names)
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache read failed: {e}")
+            rows = []
+
+        now = time.time()
+        found = {}
+        for site_name, payload, stored_at in rows:
+            entry = CachedResult(payload=json.loads(payload), stored_at=stored_at)
+            if self._is_fresh(entry, now):
+                found[site_name] = entry
+        self.hits += len(found)
+        self.misses += len(site_names) - len(found)
+        return found
+
+    async def put(self, site_name: str, username: str, payload: dict):
+        now = time.time()
+        self._pending.append((
+            site_name,
+            username,
+            payload.get("status", "error"),
+            json.dumps(payload),
+            now,
+            now
+        ))
+        if len(self._pending) >= self.flush_threshold:
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except sqlite3.Error as e:
+                logger.warning(f"Result cache write failed, dropped {len(rows)} entries: {e}")
+
+    async def clear(self):
+        self._pending = []
+        await asyncio.to_thread(self._delete_all)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "sqlite", "path": str(self.path), "pending_writes": len(self._pending)}
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import time
+import uuid
+from enum import Enum
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from services.username_service import EventType, StreamEvent, StreamingUsernameSearchService
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+def parse_event_id(value: str) -> Tuple[Optional[str], int]:
+    """(search_id, index) from an SSE id "<search_id>:<index>", or (None, index) from a bare index"""
+    search_id, _, index = value.strip().rpartition(":")
+    return search_id or None, int(index)
+
+
+class SearchJob:
+    """
+    One username search running on the server, independent of any client.
+
+    Every event the search produces is appended to events. An event's SSE id
+    is "<search_id>:<index>", so a client that reconnects with that
+    Last-Event-ID resumes this job at index + 1.
+    """
+
+    def __init__(self, search_id: str, username: str, params: dict):
+        self.search_id = search_id
+        self.username = username
+        self.params = params
+        self.events: List[StreamEvent] = []
+        self.status = JobStatus.RUNNING
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.last_watched_at = self.created_at
+        self.watchers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """Set on the next append or finish"""
+        return self._changed
+
+    @property
+    def done(self) -> bool:
+        return self.status != JobStatus.RUNNING
+
+    def append(self, batch: List[StreamEvent]):
+        self.events.extend(batch)
+        self._notify()
+
+    def finish(self, status: JobStatus):
+        self.status = status
+        self.finished_at = time.time()
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current generation, then start a new one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def idle_since(self) -> float:
+        return max(self.last_watched_at, self.finished_at or 0.0)
+
+    def summary(self) -> dict:
+        completed = next(
+            (e.data for e in reversed(self.events) if e.event_type == EventType.SEARCH_COMPLETED),
+            None
+        )
+        return {
+            "search_id": self.search_id,
+            "username": self.username,
+            "status": self.status.value,
+            "params": self.params,
+            "events": len(self.events),
+            "last_event_id": len(self.events) - 1,
+            "watchers": self.watchers,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": completed,
+        }
+
+
+class SearchJobManager:
+    """
+    Runs username searches as server-side jobs that outlive their SSE clients.
+
+    Clients attach by search_id and replay from any event offset. A running
+    job left without watchers for abandon_seconds is cancelled, so a closed
+    tab does not hold one of the max_running slots until the scan ends; a
+    client that reconnects within that window resumes it. Jobs nobody has
+    watched for ttl_seconds are collected. Per-site results also land in the service's
+    result cache, so a search re-issued after a restart is mostly replayed.
+    Jobs created with sharded=True run on shard_pool instead of the service.
+    """
+
+    def __init__(self,
+                 service: StreamingUsernameSearchService,
+                 shard_pool=None,
+                 ttl_seconds: float = 15 * 60,
+                 max_jobs: int = 200,
+                 max_running: int = 20,
+                 abandon_seconds: float = 120,
+                 sweep_interval: float = 15):
+        self.service = service
+        self.shard_pool = shard_pool
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.max_running = max_running
+        self.abandon_seconds = abandon_seconds
+        self.sweep_interval = sweep_interval
+        self._jobs: Dict[str, SearchJob] = {}
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+        for job in list(self._jobs.values()):
+            await self.cancel(job.search_id)
+
+    def create(self, username: str, sharded: bool = False, **params) -> SearchJob:
+        """Start a search job; raises 429 when too many are running"""
+        if sharded and not (self.shard_pool and self.shard_pool.started):
+            raise HTTPException(status_code=400, detail="Sharded search is not enabled (USERNAME_SEARCH_SHARDS)")
+        self.collect()
+        running = sum(1 for job in self._jobs.values() if not job.done)
+        if running >= self.max_running:
+            raise HTTPException(status_code=429, detail="Too many running searches, retry shortly")
+        if len(self._jobs) >= self.max_jobs:
+            self._evict_finished(len(self._jobs) - self.max_jobs + 1)
+
+        job = SearchJob(str(uuid.uuid4()), username, {**params, "sharded": sharded})
+        self._jobs[job.search_id] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def find(self, search_id: str) -> Optional[SearchJob]:
+        return self._jobs.get(search_id)
+
+    def get(self, search_id: str) -> SearchJob:
+        job = self._jobs.get(search_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Search {search_id} not found or expired")
+        return job
+
+    async def cancel(self, search_id: str) -> SearchJob:
+        job = self.get(search_id)
+        if job.task and not job.task.done():
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+        return job
+
+    async def follow(self,
+                     job: SearchJob,
+                     last_event_id: Optional[int] = None,
+                     max_batch: int = 256) -> AsyncGenerator[List[Tuple[int, StreamEvent]], None]:
+        """
+        Replay stored events after last_event_id, then follow live ones.
+
+        Yields (event_id, event) batches and ends once the job has finished
+        and everything has been delivered.
+        """
+        position = 0 if last_event_id is None else max(0, last_event_id + 1)
+        job.watchers += 1
+        try:
+            while True:
+                changed = job.changed
+                if position < len(job.events):
+                    batch = job.events[position:position + max_batch]
+                    yield list(enumerate(batch, position))
+                    position += len(batch)
+                    continue
+                if job.done:
+                    return
+                await changed.wait()
+        finally:
+            job.watchers -= 1
+            job.last_watched_at = time.time()
+
+    async def _run(self, job: SearchJob):
+        params = dict(job.params)
+        source = self.shard_pool if params.pop("sharded") else self.service
+        try:
+            async for batch in source.stream_search_batches(
+                username=job.username,
+                search_id=job.search_id,
+                **params
+            ):
+                job.append(batch)
+        except asyncio.CancelledError:
+            job.append([StreamEvent(
+                event_type=EventType.ERROR,
+                data={"search_id": job.search_id, "message": "Search cancelled"}
+            )])
+            job.finish(JobStatus.CANCELLED)
+            raise
+        except Exception as e:
+            logger.error(f"Search job {job.search_id} failed: {e}")
+            job.append([StreamEvent(
+                event_type=EventType.ERROR,
+                data={"search_id": job.search_id, "message": str(e)}
+            )])
+            job.finish(JobStatus.FAILED)
+        else:
+            job.finish(JobStatus.COMPLETED)
+
+    def collect(self) -> int:
+        """Cancel running jobs nobody watches any more and drop jobs idle for longer than the TTL"""
+        now = time.time()
+        for job in self._jobs.values():
+            if (
+                not job.done
+                and job.watchers == 0
+                and job.last_watched_at < now - self.abandon_seconds
+                and job.task and not job.task.done()
+            ):
+                logger.info(f"Cancelling search job {job.search_id}: no watcher for {self.abandon_seconds:.0f}s")
+                job.task.cancel()
+
+        cutoff = now - self.ttl_seconds
+        expired = [
+            job for job in self._jobs.values()
+            if job.watchers == 0 and job.idle_since() < cutoff
+        ]
+        for job in expired:
+            if job.task and not job.task.done():
+                job.task.cancel()
+            del self._jobs[job.search_id]
+        if expired:
+            logger.info(f"Collected {len(expired)} idle search jobs")
+        return len(expired)
+
+    def _evict_finished(self, count: int):
+        finished = sorted(
+            (job for job in self._jobs.values() if job.done and job.watchers == 0),
+            key=lambda job: job.idle_since()
+        )
+        for job in finished[:count]:
+            del self._jobs[job.search_id]
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.collect()
+
+    def stats(self) -> dict:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status.value] = by_status.get(job.status.value, 0) + 1
+        return {
+            "jobs": len(self._jobs),
+            "by_status": by_status,
+            "watchers": sum(job.watchers for job in self._jobs.values()),
+            "stored_events": sum(len(job.events) for job in self._jobs.values()),
+            "ttl_seconds": self.ttl_seconds,
+            "max_jobs": self.max_jobs,
+            "max_running": self.max_running,
+            "abandon_seconds": self.abandon_seconds,
+        }
@@ -1,31 +1,49 @@
 import aiohttp
 import asyncio
+import codecs
+import heapq
 import random
 import json
 import time
 import logging
-from typing import List, Optional, AsyncGenerator
-from urllib.parse import parse_qsl, urlparse, parse_qs, quote
+from typing import Callable, Dict, Iterable, List, Optional, AsyncGenerator, Set, Tuple, Union
+from urllib.parse import urlparse, parse_qs, quote
 from bs4 import BeautifulSoup
 from fastapi import HTTPException
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
-from collections import defaultdict
 import re
-from aiohttp import TCPConnector, ClientTimeout
+from aiohttp import ClientTimeout
 from functools import lru_cache
-from datetime import datetime
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import uuid
 
+from services.dns_cache import connector as dns_connector
+from services.profile_extractor import ProfileExtractor
+from services.site_latency_profile import SiteLatencyProfile
+from services.username_result_cache import SiteResultCache
+from services.username_transport import (
+    HTTP2_AVAILABLE,
+    CheckResponse,
+    ConnectionStats,
+    HTTP2Client,
+    HTTP2Unsupported,
+    connection_trace_config,
+    open_http1,
+)
+from services.wmn_metadata_store import WMNMetadataStore
+from services.wmn_matcher import StreamingMatch
+from services.wmn_site_plan import SiteCheckPlan, SiteIndex, build_site_index, quote_account
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 try:
-    from socid_extractor import extract
+    import orjson
 except ImportError:
-    extract = None
-    logger.warning("socid_extractor not installed. Profile extraction disabled.")
-
+    orjson = None
 
 class CheckStatus(Enum):
     """Status of username check"""
@@ -47,70 +65,128 @@ class EventType(Enum):
     DUCKDUCKGO_STARTED = "duckduckgo_started"
     DUCKDUCKGO_RESULT = "duckduckgo_result"
     PROFILE_EXTRACTED = "profile_extracted"
+    BATCH_STARTED = "batch_started"
+    BATCH_COMPLETED = "batch_completed"
 
 
-def serialize_enum_dict(data: dict) -> dict:
-    """Recursively serialize enum values in a dictionary to their string values"""
-    if isinstance(data, dict):
-        return {key: serialize_enum_dict(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [serialize_enum_dict(item) for item in data]
-    elif isinstance(data, Enum):
-        return data.value
-    else:
-        return data
+def _json_default(value):
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(payload) -> str:
+    """Event JSON; orjson when installed. Enums in data are written as their values"""
+    if orjson:
+        return orjson.dumps(payload, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(payload, default=_json_default)
+
+
+class _UTCClock:
+    """
+    ISO-8601 UTC timestamps matching datetime.isoformat(), without building a
+    datetime per call: the date and time-of-day are formatted once per second.
+    """
+    __slots__ = ("_second", "_prefix")
+
+    def __init__(self):
+        self._second = -1
+        self._prefix = ""
+
+    def isoformat(self, with_offset: bool = True) -> str:
+        now = time.time()
+        second = int(now)
+        if second != self._second:
+            self._prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+            self._second = second
+        micros = int((now - second) * 1_000_000)
+        stamp = f"{self._prefix}.{micros:06d}" if micros else self._prefix
+        return f"{stamp}+00:00" if with_offset else stamp
+
+
+_clock = _UTCClock()
 
 
-@dataclass
 class StreamEvent:
     """Event to be streamed to client"""
-    event_type: EventType
-    data: dict
-    timestamp: str = None
+    __slots__ = ("event_type", "data", "timestamp")
+
+    def __init__(self, event_type: EventType, data: dict, timestamp: Optional[str] = None):
+        self.event_type = event_type
+        self.data = data
+        self.timestamp = timestamp or _clock.isoformat()
 
-    def __post_init__(self):
-        if not self.timestamp:
-            from datetime import datetime, timezone
-            self.timestamp = datetime.now(timezone.utc).isoformat()
+    def __repr__(self) -> str:
+        return f"StreamEvent(event_type={self.event_type}, data={self.data!r}, timestamp={self.timestamp!r})"
 
     def to_dict(self) -> dict:
-        """Convert to dict with serializable event_type and data"""
-        d = asdict(self)
-        d["event_type"] = self.event_type.value
-        d["data"] = serialize_enum_dict(d["data"])
-        return d
+        """Convert to dict with serializable event_type; data is shared, not copied"""
+        return {"event_type": self.event_type.value, "data": self.data, "timestamp": self.timestamp}
 
-    def to_sse(self) -> str:
-        """Convert to Server-Sent Event format"""
-        return f"data: {json.dumps(self.to_dict())}\n\n"
+    def to_sse(self, event_id: Optional[Union[int, str]] = None) -> str:
+        """Convert to Server-Sent Event format, with an id line for resumable streams"""
+        if event_id is not None:
+            return f"id: {event_id}\ndata: {dumps_json(self.to_dict())}\n\n"
+        return f"data: {dumps_json(self.to_dict())}\n\n"
 
     def to_json(self) -> dict:
         """Convert to JSON for WebSocket"""
         return self.to_dict()
 
 
-@dataclass
 class SiteResult:
     """Result from checking a single site"""
-    site_name: str
-    category: str
-    url: str
-    status: CheckStatus
-    status_code: Optional[int] = None
-    profile_data: Optional[dict] = None
-    error_message: Optional[str] = None
-    response_time: Optional[float] = None
-    checked_at: Optional[str] = None
-
-    def __post_init__(self):
-        if not self.checked_at:
-            self.checked_at = datetime.utcnow().isoformat()
+    __slots__ = (
+        "site_name", "category", "url", "status", "status_code", "profile_data",
+        "error_message", "response_time", "checked_at", "cached"
+    )
+
+    def __init__(self,
+                 site_name: str,
+                 category: str,
+                 url: str,
+                 status: CheckStatus,
+                 status_code: Optional[int] = None,
+                 profile_data: Optional[dict] = None,
+                 error_message: Optional[str] = None,
+                 response_time: Optional[float] = None,
+                 checked_at: Optional[str] = None,
+                 cached: bool = False):
+        self.site_name = site_name
+        self.category = category
+        self.url = url
+        self.status = status
+        self.status_code = status_code
+        self.profile_data = profile_data
+        self.error_message = error_message
+        self.response_time = response_time
+        self.checked_at = checked_at or _clock.isoformat(with_offset=False)
+        self.cached = cached
+
+    def __repr__(self) -> str:
+        return f"SiteResult(site_name={self.site_name!r}, status={self.status}, url={self.url!r})"
 
     def to_dict(self) -> dict:
         """Convert to dict with serialized enum values"""
-        data = asdict(self)
-        data["status"] = self.status.value
-        return data
+        return {
+            "site_name": self.site_name,
+            "category": self.category,
+            "url": self.url,
+            "status": self.status.value,
+            "status_code": self.status_code,
+            "profile_data": self.profile_data,
+            "error_message": self.error_message,
+            "response_time": self.response_time,
+            "checked_at": self.checked_at,
+            "cached": self.cached,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SiteResult":
+        """Rebuild a result stored with to_dict"""
+        fields = {key: value for key, value in data.items() if key in cls.__slots__}
+        fields["status"] = CheckStatus(fields["status"])
+        return cls(**fields)
 
 
 @dataclass
@@ -120,56 +196,320 @@ class SiteCheckOutcome:
     response_text: Optional[str] = None
 
 
+_CONFIRMATION_TEMPLATES = {
+    "Fanslist (OnlyFans)": r'data-username=["\']{username}["\']',
+    "HackerOne": r'"username"\s*:\s*"{username}"',
+    "Pinterest": r'\({username}\)\s*-\s*Profile\s*\|\s*Pinterest',
+}
+
+
+@lru_cache(maxsize=1024)
+def _confirmation_regex(site_name: str, username: str) -> Optional[re.Pattern]:
+    """Per-username confirmation regex, compiled once per (site, username)"""
+    template = _CONFIRMATION_TEMPLATES.get(site_name)
+    if template is None:
+        return None
+    return re.compile(template.replace("{username}", re.escape(username)), re.IGNORECASE)
+
+
+class _BodyDecoder:
+    """Incremental UTF-8 decoding that degrades to latin-1 like a full-body decode would"""
+
+    def __init__(self):
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._latin1 = False
+
+    def decode(self, chunk: bytes) -> str:
+        if not self._latin1:
+            try:
+                return self._utf8.decode(chunk)
+            except UnicodeDecodeError:
+                self._latin1 = True
+        return chunk.decode("latin-1", errors="ignore")
+
+    def flush(self) -> str:
+        if self._latin1:
+            return ""
+        try:
+            return self._utf8.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return ""
+
+
+class _HostBucket:
+    """Token bucket state for one host"""
+    __slots__ = ("rate", "tokens", "updated", "blocked_until", "granted", "delayed", "throttled")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = now
+        self.blocked_until = 0.0
+        self.granted = 0
+        self.delayed = 0
+        self.throttled = 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds from now (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
 class RateLimiter:
-    """Rate limiter for API requests"""
-    def __init__(self, max_requests: int = 100, time_window: int = 60):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.requests = defaultdict(list)
-        self._lock = asyncio.Lock()
+    """
+    Adaptive per-host token bucket.
+
+    Each host refills at its own rate. A request takes a token, or reserves
+    one by driving the balance negative and sleeping until it is repaid, so
+    bursts queue fairly with no lock (nothing awaits between read and update).
+    Rates adapt AIMD-style: every normal response adds `increase` req/s, and a
+    429 (or 503 with Retry-After) multiplies the rate by `decrease` and blocks
+    the host until Retry-After has passed.
+    """
+    def __init__(self,
+                 rate: float = 5.0,
+                 burst: float = 20.0,
+                 min_rate: float = 0.1,
+                 max_rate: float = 50.0,
+                 increase: float = 0.25,
+                 decrease: float = 0.5,
+                 max_retry_after: float = 120.0):
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retry_after = max_retry_after
+        self._buckets: dict[str, _HostBucket] = {}
+
+    def _bucket(self, domain: str, now: float) -> _HostBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = self._buckets[domain] = _HostBucket(self.initial_rate, self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+            bucket.updated = now
+        return bucket
 
     async def wait_if_needed(self, domain: str) -> float:
-        """Wait if rate limit would be exceeded, return wait time"""
-        async with self._lock:
-            now = time.time()
-            self.requests[domain] = [
-                t for t in self.requests[domain]
-                if now - t < self.time_window
-            ]
-
-            if len(self.requests[domain]) >= self.max_requests:
-                sleep_time = self.time_window - (now - self.requests[domain][0])
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-                    self.requests[domain].clear()
-                    self.requests[domain].append(time.time())
-                    return sleep_time
-
-            self.requests[domain].append(now)
-            return 0
+        """Take a token for domain, sleeping if the bucket is empty; return wait time"""
+        now = time.monotonic()
+        bucket = self._bucket(domain, now)
+
+        if bucket.tokens >= 1 and bucket.blocked_until <= now:
+            bucket.tokens -= 1
+            bucket.granted += 1
+            return 0.0
+
+        bucket.tokens -= 1
+        bucket.granted += 1
+        bucket.delayed += 1
+        wait = max(-bucket.tokens / bucket.rate, bucket.blocked_until - now)
+        waited = 0.0
+        while wait > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+            # A 429 may have arrived while we slept
+            wait = bucket.blocked_until - time.monotonic()
+        return waited
+
+    def record_response(self, domain: str, status: int, retry_after: Optional[str] = None):
+        """Feed a response back into the host's rate"""
+        now = time.monotonic()
+        bucket = self._bucket(domain, now)
+        delay = parse_retry_after(retry_after)
+
+        if status == 429 or (status == 503 and delay is not None):
+            bucket.throttled += 1
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            if delay is None:
+                delay = 1.0 / bucket.rate
+            bucket.blocked_until = max(bucket.blocked_until, now + min(delay, self.max_retry_after))
+            bucket.tokens = min(bucket.tokens, 0.0)
+        else:
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def host_state(self, domain: Optional[str] = None) -> dict:
+        """Per-host limiter state for inspection"""
+        now = time.monotonic()
+        domains = [domain] if domain else list(self._buckets)
+        state = {}
+        for name in domains:
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                continue
+            tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+            state[name] = {
+                "rate": round(bucket.rate, 3),
+                "tokens": round(tokens, 2),
+                "blocked_for": round(max(0.0, bucket.blocked_until - now), 2),
+                "granted": bucket.granted,
+                "delayed": bucket.delayed,
+                "throttled": bucket.throttled,
+            }
+        return state
+
+
+class SearchControl:
+    """
+    Steering handle for one running search.
+
+    Changes made before the search starts are applied when it does; changes
+    after it has finished are ignored. Sites already running are not affected
+    by prioritize; cancel stops them.
+    """
+
+    def __init__(self):
+        self.priority_categories: Set[str] = set()
+        self.priority_sites: Set[str] = set()
+        self.cancelled = False
+        self._added: List[str] = []
+        self._listener: Optional[Callable[[], None]] = None
+
+    def prioritize(self, categories: Iterable[str] = (), sites: Iterable[str] = ()):
+        """Check pending sites in these categories (or with these names) first"""
+        self.priority_categories = set(categories)
+        self.priority_sites = set(sites)
+        self._changed()
+
+    def add_sites(self, site_names: Iterable[str]):
+        """Also check these WMN sites; names already scheduled or unknown are skipped"""
+        self._added.extend(site_names)
+        self._changed()
+
+    def cancel(self):
+        self.cancelled = True
+        self._changed()
+
+    def take_added(self) -> List[str]:
+        added, self._added = self._added, []
+        return added
+
+    def listen(self, listener: Optional[Callable[[], None]]):
+        self._listener = listener
+
+    def _changed(self):
+        if self._listener:
+            self._listener()
+
+
+class RetryBudget:
+    """
+    Extra requests one search may spend on retries and hedges.
+
+    At most ratio x first attempts, plus a small reserve so a short search can
+    still retry once or twice. A search that hits a failing host stops
+    retrying when the budget is spent instead of doubling its load.
+    """
+    __slots__ = ("ratio", "reserve", "attempts", "retries", "hedges", "hedge_wins", "denied")
+
+    def __init__(self, ratio: float = 0.1, reserve: int = 3):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def record_attempt(self):
+        self.attempts += 1
+
+    def try_spend(self, hedge: bool = False) -> bool:
+        if self.retries + self.hedges >= self.reserve + self.ratio * self.attempts:
+            self.denied += 1
+            return False
+        if hedge:
+            self.hedges += 1
+        else:
+            self.retries += 1
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "denied": self.denied,
+        }
 
 
 class StreamingUsernameSearchService:
     def __init__(self,
                  max_concurrent_requests: int = 30,
                  timeout_seconds: int = 10,
-                 max_retries: int = 1,
-                 stream_delay: float = 0.05):
+                 max_retries: int = 3,
+                 metadata_store: Optional[WMNMetadataStore] = None,
+                 body_byte_cap: int = 512 * 1024,
+                 profile_byte_cap: int = 4 * 1024 * 1024,
+                 read_chunk_size: int = 16 * 1024,
+                 result_cache: Optional[SiteResultCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 latency_profile: Optional[SiteLatencyProfile] = None,
+                 max_frame_events: int = 256,
+                 profile_extractor: Optional[ProfileExtractor] = None,
+                 http2: bool = False,
+                 retry_budget_ratio: float = 0.1,
+                 retry_backoff_base: float = 0.2,
+                 retry_backoff_cap: float = 5.0,
+                 hedge_requests: bool = False):
         """
         Initialize streaming service
 
         Args:
             max_concurrent_requests: Maximum concurrent HTTP requests
             timeout_seconds: Timeout for each request
-            max_retries: Maximum retries per site
-            stream_delay: Small delay between streaming events for smoother client experience
+            max_retries: Most attempts per site; the search's retry budget usually binds first
+            metadata_store: WMN metadata source (disk snapshot + background refresh)
+            body_byte_cap: Most bytes read per site while looking for e_string/m_string
+            profile_byte_cap: Most bytes buffered for profile extraction of a FOUND page
+            read_chunk_size: Chunk size fed to the streaming matcher
+            result_cache: Optional (site, username) result cache; None disables caching
+            rate_limiter: Per-host limiter shared by all searches of this service
+            latency_profile: Per-site latency history used for ordering and timeouts
+            max_frame_events: Most events delivered together from one burst
+            profile_extractor: Bounded worker pool for socid_extractor / JSON profile parsing
+            http2: Send HTTPS checks over multiplexed HTTP/2 where the host supports it
+            retry_budget_ratio: Extra requests (retries + hedges) a search may add, as a share of its checks
+            retry_backoff_base: First retry waits up to this long; the ceiling doubles per attempt (full jitter)
+            retry_backoff_cap: Longest wait between attempts
+            hedge_requests: Start a second GET once a check passes the site's p95 and keep the first answer
         """
         self.max_concurrent_requests = max_concurrent_requests
+        self.timeout_seconds = timeout_seconds
         self.timeout = ClientTimeout(total=timeout_seconds)
         self.max_retries = max_retries
-        self.stream_delay = stream_delay
-        self._metadata_cache = None
-        self.rate_limiter = RateLimiter()
+        self.retry_budget_ratio = retry_budget_ratio
+        self.retry_backoff_base = retry_backoff_base
+        self.retry_backoff_cap = retry_backoff_cap
+        self.hedge_requests = hedge_requests
+        self.max_frame_events = max_frame_events
+        self.metadata_store = metadata_store or WMNMetadataStore()
+        self.body_byte_cap = body_byte_cap
+        self.profile_byte_cap = profile_byte_cap
+        self.read_chunk_size = read_chunk_size
+        self.result_cache = result_cache
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.latency_profile = latency_profile or SiteLatencyProfile()
+        self.profile_extractor = profile_extractor or ProfileExtractor()
+        self.http2_client: Optional[HTTP2Client] = None
+        if http2 and HTTP2_AVAILABLE:
+            self.http2_client = HTTP2Client(max_concurrent_requests)
+        elif http2:
+            logger.warning("HTTP/2 requested but h2 is not installed; using HTTP/1.1 only")
         self.semaphore = asyncio.Semaphore(max_concurrent_requests)
 
         self.user_agents = [
@@ -192,8 +532,8 @@ class StreamingUsernameSearchService:
             "Sec-Fetch-Site": "none",
         }
 
-        self._url_pattern = re.compile(r'\{account\}')
-        self._regex_cache = {}
+        self._index: Optional[SiteIndex] = None
+        self._index_lock = asyncio.Lock()
         self._account_confirmation_sites = {
             "Arch Linux GitLab",
             "Fanslist (OnlyFans)",
@@ -209,58 +549,56 @@ class StreamingUsernameSearchService:
             "Zbiornik",
         }
 
-    @lru_cache(maxsize=1)
-    def get_metadata(self) -> dict:
-        """Fetch and cache metadata"""
-        if self._metadata_cache:
-            return self._metadata_cache
+    async def get_metadata(self) -> dict:
+        """Current WMN metadata, served from memory or the on-disk snapshot"""
+        snapshot = await self.metadata_store.get()
+        return snapshot.data
 
-        url = "https://raw.githubusercontent.com/WebBreacher/WhatsMyName/refs/heads/main/wmn-data.json"
-        try:
-            import requests
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            self._metadata_cache = response.json()
-            return self._metadata_cache
-        except Exception as e:
-            logger.error(f"Failed to fetch metadata: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Failed to fetch metadata: {str(e)}")
+    async def site_hosts(self) -> List[str]:
+        """Hostnames the current site plans check (sites with the username in the host are skipped)"""
+        hosts = []
+        for plan in await self.get_site_plans():
+            try:
+                host = urlparse(plan.site["uri_check"]).hostname
+            except ValueError:
+                continue
+            if host and "{" not in host:
+                hosts.append(host)
+        return hosts
 
     def get_random_user_agent(self) -> str:
         """Get random user agent"""
         return random.choice(self.user_agents)
 
-    def _get_compiled_regex(self, pattern: str) -> Optional[re.Pattern]:
-        """Get or compile regex pattern with caching"""
-        if pattern not in self._regex_cache:
-            try:
-                self._regex_cache[pattern] = re.compile(pattern, re.IGNORECASE)
-            except re.error:
-                self._regex_cache[pattern] = None
-        return self._regex_cache[pattern]
+    async def get_site_index(self) -> SiteIndex:
+        """Plans and category/name index for the current metadata version, built once per version"""
+        snapshot = await self.metadata_store.get()
+        index = self._index
+        if index is not None and index.version == snapshot.version:
+            return index
+
+        async with self._index_lock:
+            if self._index is None or self._index.version != snapshot.version:
+                self._index = await asyncio.to_thread(
+                    build_site_index,
+                    snapshot.version,
+                    snapshot.data.get("sites", []),
+                    self.base_headers,
+                    self._account_confirmation_sites
+                )
+            return self._index
 
-    def _text_matches_pattern(self, text: str, pattern: Optional[str]) -> bool:
-        """
-        Match text against WMN pattern rules.
-        Empty pattern means "status-code-only" match in WMN data.
-        """
-        if pattern is None:
-            return False
-        if pattern == "":
-            return True
-        if pattern in text:
-            return True
-        compiled_pattern = self._get_compiled_regex(pattern)
-        return bool(compiled_pattern and compiled_pattern.search(text))
+    async def get_site_plans(self) -> List[SiteCheckPlan]:
+        """Check plans for the current metadata version, compiled once per version"""
+        return (await self.get_site_index()).plans
 
-    def _response_confirms_account(self, site: dict, username: str, text: str) -> bool:
+    def _response_confirms_account(self, plan: SiteCheckPlan, username: str, text: str) -> bool:
         """Extra guard for noisy WMN checks whose positive strings are generic."""
-        site_name = site.get("name")
-        if site_name not in self._account_confirmation_sites:
+        if not plan.needs_confirmation:
             return True
 
+        site_name = plan.name
         username_folded = username.casefold()
-        text_folded = text.casefold()
 
         if site_name == "Arch Linux GitLab":
             try:
@@ -278,115 +616,101 @@ class StreamingUsernameSearchService:
                         return True
             return False
 
-        if site_name == "Fanslist (OnlyFans)":
-            pattern = rf'data-username=["\']{re.escape(username)}["\']'
-            return bool(re.search(pattern, text, re.IGNORECASE))
-
-        if site_name == "HackerOne":
-            pattern = rf'"username"\s*:\s*"{re.escape(username)}"'
-            return bool(re.search(pattern, text, re.IGNORECASE))
-
-        if site_name == "Pinterest":
-            title_pattern = rf'\({re.escape(username)}\)\s*-\s*Profile\s*\|\s*Pinterest'
-            return bool(re.search(title_pattern, text, re.IGNORECASE))
+        confirmation_regex = _confirmation_regex(site_name, username)
+        if confirmation_regex is not None:
+            return bool(confirmation_regex.search(text))
 
+        text_folded = text.casefold()
         if site_name == "thegatewaypundit":
             return f"/author/{username_folded}/" in text_folded
 
         return username_folded in text_folded
 
-    def _try_parse_json(self, text: str) -> Optional[dict]:
-        """Try to parse text as JSON, return dict or None"""
-        try:
-            text = text.strip()
-
-            if text.startswith(('{', '[')):
-                data = json.loads(text)
-                if isinstance(data, dict):
-                    return data
-
-            brace_start = text.find('{')
-            if brace_start != -1:
-                brace_count = 0
-                for i in range(brace_start, len(text)):
-                    if text[i] == '{':
-                        brace_count += 1
-                    elif text[i] == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_str = text[brace_start:i+1]
-                            data = json.loads(json_str)
-                            if isinstance(data, dict):
-                                return data
-                            break
-        except (json.JSONDecodeError, ValueError):
-            pass
-        return None
-
-    async def _check_response_match(self,
-                                   response_status: int,
-                                   text: str,
-                                   site: dict,
-                                   redirect_statuses: Optional[List[int]] = None) -> tuple[bool, bool]:
-        """Check if response matches expected patterns"""
-        redirect_statuses = redirect_statuses or []
-
-        if "m_code" in site and site["m_code"] in redirect_statuses:
-            return False, True
-
-        if "m_code" in site and response_status == site["m_code"]:
-            m_string = site.get("m_string")
-            if self._text_matches_pattern(text, m_string):
-                return False, True
+    async def _read_and_match(self,
+                              response: CheckResponse,
+                              plan: SiteCheckPlan,
+                              extract_profile: bool) -> tuple[bool, bool, str]:
+        """
+        Read the body only as far as the verdict needs.
 
-        if response_status == site.get("e_code"):
-            e_string = site.get("e_string")
-            if self._text_matches_pattern(text, e_string):
-                return True, False
+        Plain markers are matched chunk by chunk and reading stops once the
+        outcome is settled or body_byte_cap is reached. The body is buffered only
+        when something needs the text: account confirmation, regex markers, or
+        profile extraction of a FOUND page (which may read up to profile_byte_cap).
+        Returns (is_found, is_not_found, buffered_text).
+        """
+        status = response.status
+        if plan.has_m_code and plan.m_code in response.redirect_statuses:
+            return False, True, ""
+
+        need_m = plan.has_m_code and status == plan.m_code
+        need_e = status == plan.e_code
+        scan = StreamingMatch(plan.matcher, need_m, need_e)
+        keep_text = plan.needs_confirmation or extract_profile or not scan.streamable
+
+        pieces = []
+        decoder = _BodyDecoder()
+        bytes_read = 0
+        byte_cap = self.body_byte_cap
+
+        if not (scan.decided and not keep_text):
+            async for chunk in response.iter_chunks(self.read_chunk_size):
+                bytes_read += len(chunk)
+                piece = decoder.decode(chunk)
+                if keep_text:
+                    pieces.append(piece)
+
+                if scan.feed(piece):
+                    m_hit, e_hit = scan.result()
+                    if m_hit:
+                        break
+                    if extract_profile:
+                        byte_cap = self.profile_byte_cap
+                    elif not plan.needs_confirmation:
+                        break
 
-        return False, False
+                if bytes_read >= byte_cap:
+                    break
+            else:
+                tail = decoder.flush()
+                if keep_text:
+                    pieces.append(tail)
+                scan.feed(tail)
+
+        text = "".join(pieces)
+        if scan.streamable:
+            m_hit, e_hit = scan.result()
+        else:
+            m_hit, e_hit = plan.matcher.evaluate(text, need_m, need_e)
+        return e_hit, m_hit, text
 
     async def check_single_site(self,
                                 session: aiohttp.ClientSession,
-                                site: dict,
+                                plan: SiteCheckPlan,
                                 username: str,
-                                extract_profile: bool = False) -> SiteCheckOutcome:
-        """Check username on a single site (supports GET, JSON POST, and form POST)."""
-        PLACEHOLDER = "{account}"
+                                extract_profile: bool = False,
+                                stats: Optional[ConnectionStats] = None,
+                                started: Optional[asyncio.Event] = None) -> SiteCheckOutcome:
+        """
+        Check username on a single site (supports GET, JSON POST, and form POST).
 
-        url = self._url_pattern.sub(quote(username), site["uri_check"])
-        url = url.replace(PLACEHOLDER, quote(username))
+        HTTPS checks go over the HTTP/2 client when it is enabled and the host
+        supports it, otherwise over the aiohttp session. started is set once the
+        request leaves the rate limiter and semaphore queues.
+        """
+        url = plan.check_url(quote_account(username))
         domain = urlparse(url).netloc
 
-        headers = self.base_headers.copy()
-        headers["User-Agent"] = self.get_random_user_agent()
-        if "headers" in site:
-            headers.update(site["headers"])
-
-        is_post = bool(site.get("post_body"))
-        data = None
-        json_data = None
-
-        if is_post:
-            post_body = site["post_body"].replace(PLACEHOLDER, username)
-            content_type = headers.get("Content-Type", "").lower()
-
-            if "json" in content_type:
-                try:
-                    json_data = json.loads(post_body)
-                except json.JSONDecodeError:
-                    json_data = post_body
-            elif "form-urlencoded" in content_type:
-                data = dict(parse_qsl(post_body))
-            else:
-                data = post_body
+        headers = plan.headers.copy()
+        if not plan.sets_user_agent:
+            headers["User-Agent"] = self.get_random_user_agent()
 
         base_result = {
-            "site_name": site["name"],
-            "category": site.get("cat", "unknown"),
+            "site_name": plan.name,
+            "category": plan.category,
         }
 
-        if site.get("name") == "Mixi" and not username.isdigit():
+        if plan.numeric_only and not username.isdigit():
             return SiteCheckOutcome(
                 result=SiteResult(
                     **base_result,
@@ -396,56 +720,51 @@ class StreamingUsernameSearchService:
                 )
             )
 
-        start_time = time.time()
+        timeout = self.latency_profile.timeout_for(plan.name, self.timeout_seconds)
+        request_timeout = self.timeout if timeout == self.timeout_seconds else ClientTimeout(total=timeout)
 
-        async with self.semaphore:
-            wait_time = await self.rate_limiter.wait_if_needed(domain)
-            if wait_time > 0:
-                logger.debug(f"Rate limited for {domain}, waited {wait_time:.2f}s")
+        # Wait for the host's token before taking a slot, so a throttled host
+        # does not hold semaphore capacity while it sleeps
+        wait_time = await self.rate_limiter.wait_if_needed(domain)
+        if wait_time > 0:
+            logger.debug(f"Rate limited for {domain}, waited {wait_time:.2f}s")
 
+        async with self.semaphore:
+            start_time = time.time()
+            if started is not None:
+                started.set()
             try:
-                method = 'POST' if is_post else 'GET'
-                request_kwargs = {
-                    'url': url,
-                    'headers': headers,
-                    'timeout': self.timeout,
-                    'allow_redirects': True,
-                    'ssl': False
-                }
-
-                if is_post:
-                    if isinstance(json_data, dict):
-                        request_kwargs['json'] = json_data
-                    elif data:
-                        request_kwargs['data'] = data
-
-                async with session.request(method, **request_kwargs) as response:
-                    raw_bytes = await response.read()
-
-                    try:
-                        text = raw_bytes.decode('utf-8')
-                    except UnicodeDecodeError:
-                        text = raw_bytes.decode('latin-1', errors='ignore')
-
-                    response_time = time.time() - start_time
-
-                    is_found, is_not_found = await self._check_response_match(
-                        response.status,
-                        text,
-                        site,
-                        [history_response.status for history_response in response.history]
+                async with AsyncExitStack() as stack:
+                    body = plan.request_body(username)
+                    response = None
+                    if self.http2_client and self.http2_client.handles(url):
+                        try:
+                            response = await stack.enter_async_context(self.http2_client.open(
+                                plan.http_method, url, headers, timeout, body, stats
+                            ))
+                        except HTTP2Unsupported:
+                            response = None
+                    if response is None:
+                        response = await stack.enter_async_context(open_http1(
+                            session, plan.http_method, url, headers, request_timeout, body, stats
+                        ))
+
+                    self.rate_limiter.record_response(
+                        domain, response.status, response.headers.get("Retry-After")
+                    )
+                    is_found, is_not_found, text = await self._read_and_match(
+                        response, plan, extract_profile
                     )
+                    response_time = time.time() - start_time
 
-                    if is_found and not self._response_confirms_account(site, username, text):
+                    if is_found and not self._response_confirms_account(plan, username, text):
                         is_found = False
                         is_not_found = True
 
                     if is_found:
-                        url = site.get("uri_pretty", site["uri_check"]).replace("{account}", username)
-
                         result = SiteResult(
                             **base_result,
-                            url=url,
+                            url=plan.pretty_url(username),
                             status=CheckStatus.FOUND,
                             status_code=response.status,
                             response_time=response_time
@@ -467,6 +786,18 @@ class StreamingUsernameSearchService:
                             )
                         )
 
+                    elif response.status == 429:
+                        return SiteCheckOutcome(
+                            result=SiteResult(
+                                **base_result,
+                                url=url,
+                                status=CheckStatus.RATE_LIMITED,
+                                status_code=response.status,
+                                error_message="Rate limited (HTTP 429)",
+                                response_time=response_time
+                            )
+                        )
+
                     else:
                         return SiteCheckOutcome(
                             result=SiteResult(
@@ -510,53 +841,138 @@ class StreamingUsernameSearchService:
                     )
                 )
 
+    @staticmethod
+    def _is_retryable(result: SiteResult) -> bool:
+        """Timeouts, 429s, connection failures and 5xx; anything else will not change on retry"""
+        if result.status == CheckStatus.RATE_LIMITED:
+            return True
+        if result.status != CheckStatus.ERROR:
+            return False
+        message = result.error_message or ""
+        return (
+            message == "Timeout"
+            or message.startswith("Client error")
+            or (result.status_code is not None and result.status_code >= 500)
+        )
+
+    async def _hedged_check(self,
+                            session: aiohttp.ClientSession,
+                            plan: SiteCheckPlan,
+                            username: str,
+                            extract_profile: bool,
+                            stats: Optional[ConnectionStats],
+                            budget: Optional[RetryBudget]) -> SiteCheckOutcome:
+        """
+        One attempt, hedged: if it outlives the site's p95, a second identical
+        GET starts and the first decisive answer wins. The other is cancelled.
+        Time spent queued for the rate limiter or semaphore does not count.
+        """
+        hedge_after = self.latency_profile.p95(plan.name) if self.hedge_requests else None
+        if budget is None or hedge_after is None or plan.http_method != "GET":
+            return await self.check_single_site(session, plan, username, extract_profile, stats)
+
+        started = asyncio.Event()
+        primary = asyncio.create_task(
+            self.check_single_site(session, plan, username, extract_profile, stats, started)
+        )
+        attempts = {primary}
+        waiting_start = asyncio.create_task(started.wait())
+        try:
+            await asyncio.wait({primary, waiting_start}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if done or not budget.try_spend(hedge=True):
+                return await primary
+
+            attempts.add(asyncio.create_task(
+                self.check_single_site(session, plan, username, extract_profile, stats)
+            ))
+            outcome = None
+            pending = attempts
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate = task.result()
+                    if outcome is None or outcome.result.status == CheckStatus.ERROR:
+                        outcome = candidate
+                        if task is not primary:
+                            budget.hedge_wins += 1
+                if outcome.result.status != CheckStatus.ERROR:
+                    break
+            return outcome
+        finally:
+            waiting_start.cancel()
+            for task in attempts:
+                task.cancel()
+
     async def check_site_with_retry(self,
                                    session: aiohttp.ClientSession,
-                                   site: dict,
+                                   plan: SiteCheckPlan,
                                    username: str,
-                                   extract_profile: bool = False) -> SiteCheckOutcome:
-        """Check site with retry logic and exponential backoff"""
-        last_result = None
+                                   extract_profile: bool = False,
+                                   stats: Optional[ConnectionStats] = None,
+                                   budget: Optional[RetryBudget] = None) -> SiteCheckOutcome:
+        """
+        Check site, retrying transient failures with jittered exponential backoff.
+
+        Retries and hedges are paid from the search's budget; without one, a
+        site gets up to max_retries attempts and no hedging.
+        """
+        outcome = None
 
         for attempt in range(max(1, self.max_retries)):
-            outcome = await self.check_single_site(session, site, username, extract_profile)
+            if attempt == 0:
+                if budget is not None:
+                    budget.record_attempt()
+            elif budget is not None and not budget.try_spend():
+                break
+
+            outcome = await self._hedged_check(session, plan, username, extract_profile, stats, budget)
             result = outcome.result
-            if site["name"] == "Github":
+            self.latency_profile.record(
+                plan.name, result.response_time, timed_out=result.error_message == "Timeout"
+            )
+            if plan.name == "Github":
                 logger.info(f"Github check result: {result.status}, error: {result.error_message}")
 
-            if result.status in [CheckStatus.FOUND, CheckStatus.NOT_FOUND]:
-                return outcome
-
-            last_result = outcome
-
-            # Only retry on timeout or rate limit errors
-            if result.error_message and any(x in result.error_message.lower()
-                                           for x in ['timeout', 'rate limit', 'too many']):
-                if attempt < self.max_retries - 1:
-                    backoff_time = 0.2 * (2 ** attempt)
-                    await asyncio.sleep(backoff_time)
-            else:
-                # Don't retry other errors
+            if not self._is_retryable(result) or attempt == self.max_retries - 1:
                 break
 
-        return last_result
+            # Full jitter: spread retries of many sites over the whole window.
+            # Rate-limited hosts additionally wait out Retry-After in the rate limiter.
+            ceiling = min(self.retry_backoff_cap, self.retry_backoff_base * (2 ** attempt))
+            await asyncio.sleep(random.uniform(0, ceiling))
 
-    async def extract_profile_data(self, text: str, url: str) -> Optional[dict]:
-        """Extract profile data without blocking the event loop."""
-        profile_data = None
+        return outcome
 
-        if extract:
-            try:
-                profile_data = await asyncio.to_thread(extract, text)
-            except Exception as e:
-                logger.debug(f"socid_extractor failed for {url}: {e}")
+    async def extract_profile_data(self, text: str, url: str) -> Optional[dict]:
+        """Extract profile data off the event loop (see ProfileExtractor)"""
+        return await self.profile_extractor.extract(text, url)
 
-        if not profile_data:
-            parsed_json = self._try_parse_json(text)
-            if parsed_json:
-                profile_data = parsed_json
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Pooled client session; limit_per_host keeps any single host from being flooded.
+        Hostnames resolve through the process-wide DNS cache, not a per-session one.
+        """
+        return aiohttp.ClientSession(
+            connector=dns_connector(
+                limit=self.max_concurrent_requests,
+                limit_per_host=5,
+                force_close=False,
+                enable_cleanup_closed=True
+            ),
+            timeout=self.timeout,
+            trust_env=True,
+            trace_configs=[connection_trace_config()]
+        )
 
-        return profile_data
+    @asynccontextmanager
+    async def _session_scope(self, session: Optional[aiohttp.ClientSession] = None):
+        """Yield the given session, or own a fresh one for the duration of the block"""
+        if session is not None:
+            yield session
+            return
+        async with self.create_session() as owned_session:
+            yield owned_session
 
     async def stream_duckduckgo_search(self,
                                       session: aiohttp.ClientSession,
@@ -605,7 +1021,6 @@ class StreamingUsernameSearchService:
                                         "title": a_tag.get_text(strip=True)
                                     }
                                 ))
-                                await asyncio.sleep(self.stream_delay)
 
         except Exception as e:
             logger.error(f"DuckDuckGo search error: {str(e)}")
@@ -615,27 +1030,80 @@ class StreamingUsernameSearchService:
                            include_duckduckgo: bool = False,
                            extract_profile: bool = False,
                            categories: Optional[List[str]] = None,
-                           priority_sites: Optional[List[str]] = None) -> AsyncGenerator[StreamEvent, None]:
+                           priority_sites: Optional[List[str]] = None,
+                           refresh: Optional[List[str]] = None,
+                           shared_session: Optional[aiohttp.ClientSession] = None,
+                           search_id: Optional[str] = None,
+                           control: Optional[SearchControl] = None) -> AsyncGenerator[StreamEvent, None]:
+        """Stream search results one event at a time (see stream_search_batches)"""
+        async for batch in self.stream_search_batches(
+            username=username,
+            include_duckduckgo=include_duckduckgo,
+            extract_profile=extract_profile,
+            categories=categories,
+            priority_sites=priority_sites,
+            refresh=refresh,
+            shared_session=shared_session,
+            search_id=search_id,
+            control=control
+        ):
+            for event in batch:
+                yield event
+
+    async def stream_search_batches(self,
+                                    username: str,
+                                    include_duckduckgo: bool = False,
+                                    extract_profile: bool = False,
+                                    categories: Optional[List[str]] = None,
+                                    priority_sites: Optional[List[str]] = None,
+                                    refresh: Optional[List[str]] = None,
+                                    shared_session: Optional[aiohttp.ClientSession] = None,
+                                    search_id: Optional[str] = None,
+                                    control: Optional[SearchControl] = None,
+                                    site_names: Optional[Iterable[str]] = None) -> AsyncGenerator[List[StreamEvent], None]:
         """
         Stream search results as they become available
+
+        Each yielded list holds every event that was ready at that moment,
+        FOUND results and profiles first, so a burst of completions can be
+        written as one frame. Delivery is driven by task completion: nothing
+        polls, and the stream ends as soon as the last site task finishes.
+
+        Cached results are replayed with "cached": true unless their class
+        ("found", "not_found", "error" or "all") is listed in refresh.
+        Pass shared_session to reuse an existing connection pool (batch searches);
+        otherwise a session is created and closed for this search.
+        search_id defaults to a fresh UUID; SearchJobManager passes its own.
+        Pass a SearchControl to cancel, reprioritize or add sites mid-search;
+        sites are started through a window of 2 x max_concurrent_requests so
+        the order of the rest can still change.
+        site_names restricts the search to those sites (one shard of a sharded search).
         """
-        search_id = str(uuid.uuid4())
+        search_id = search_id or str(uuid.uuid4())
         start_time = time.time()
 
-        metadata = self.get_metadata()
-        sites = metadata.get("sites", [])
+        index = await self.get_site_index()
+        sites = index.select(categories, site_names)
 
-        if categories:
-            categories_set = set(categories)
-            sites = [s for s in sites if s.get("cat") in categories_set]
+        sites = self.latency_profile.order(sites, self.timeout_seconds)
 
         if priority_sites:
             priority_set = set(priority_sites)
-            priority = [s for s in sites if s.get("name") in priority_set]
-            regular = [s for s in sites if s.get("name") not in priority_set]
+            priority = [p for p in sites if p.name in priority_set]
+            regular = [p for p in sites if p.name not in priority_set]
             sites = priority + regular
 
-        yield StreamEvent(
+        cached_results = {}
+        if self.result_cache:
+            refresh_classes = set(refresh or [])
+            if "all" not in refresh_classes:
+                cached_results = {
+                    name: entry
+                    for name, entry in (await self.result_cache.get_many(username, [p.name for p in sites])).items()
+                    if entry.result_class not in refresh_classes
+                }
+
+        yield [StreamEvent(
             event_type=EventType.SEARCH_STARTED,
             data={
                 "search_id": search_id,
@@ -643,14 +1111,17 @@ class StreamingUsernameSearchService:
                 "total_sites": len(sites),
                 "categories": categories,
                 "include_duckduckgo": include_duckduckgo,
-                "extract_profile": extract_profile
+                "extract_profile": extract_profile,
+                "cached_sites": len(cached_results)
             }
-        )
+        )]
 
         found_count = 0
         not_found_count = 0
         error_count = 0
         checked_count = 0
+        connection_stats = ConnectionStats()
+        retry_budget = RetryBudget(self.retry_budget_ratio)
 
         result_queue = asyncio.PriorityQueue()
         queue_sequence = 0
@@ -669,25 +1140,52 @@ class StreamingUsernameSearchService:
                 return 3
             return 4
 
+        drain_priority = 5
+
         async def queue_event(event: StreamEvent):
             nonlocal queue_sequence
             sequence = queue_sequence
             queue_sequence += 1
             await result_queue.put((event_priority(event), sequence, event))
 
-        async def process_site(site: dict):
+        async def replay_cached(plan: SiteCheckPlan):
+            """Emit a cached result without touching the network"""
+            result = SiteResult.from_dict(cached_results[plan.name].payload)
+            result.cached = True
+            await queue_event(StreamEvent(
+                event_type=EventType.SITE_RESULT,
+                data=result.to_dict()
+            ))
+            if extract_profile and result.status == CheckStatus.FOUND and result.profile_data:
+                await queue_event(StreamEvent(
+                    event_type=EventType.PROFILE_EXTRACTED,
+                    data={
+                        "site_name": result.site_name,
+                        "category": result.category,
+                        "url": result.url,
+                        "profile_data": result.profile_data,
+                        "checked_at": result.checked_at,
+                        "cached": True
+                    }
+                ))
+
+        async def process_site(plan: SiteCheckPlan):
             """Process a single site and add to queue"""
+            if plan.name in cached_results:
+                await replay_cached(plan)
+                return
+
             await queue_event(StreamEvent(
                 event_type=EventType.SITE_CHECKING,
                 data={
-                    "site_name": site["name"],
-                    "category": site.get("cat", "unknown"),
-                    "url": site["uri_check"].replace("{account}", username)
+                    "site_name": plan.name,
+                    "category": plan.category,
+                    "url": plan.display_url(username)
                 }
             ))
 
             outcome = await self.check_site_with_retry(
-                session, site, username, extract_profile
+                session, plan, username, extract_profile, connection_stats, retry_budget
             )
             result = outcome.result
 
@@ -715,99 +1213,131 @@ class StreamingUsernameSearchService:
                         }
                     ))
 
-        connector = TCPConnector(
-            limit=self.max_concurrent_requests,
-            limit_per_host=5,
-            ttl_dns_cache=300,
-            force_close=False,
-            enable_cleanup_closed=True
-        )
+            if self.result_cache:
+                await self.result_cache.put(plan.name, username, result.to_dict())
 
-        async with aiohttp.ClientSession(
-            connector=connector,
-            timeout=self.timeout,
-            trust_env=True
-        ) as session:
-            tasks = []
-            for site in sites:
-                task = asyncio.create_task(process_site(site))
-                tasks.append(task)
+        site_index = index.by_name
+        control = control or SearchControl()
+        window = max(1, self.max_concurrent_requests * 2)
+        pending: List[Tuple[int, int, SiteCheckPlan]] = []
+        scheduled: Dict[str, int] = {}
+        tasks = set()
+        in_flight = 0
+        drained = False
 
+        def rank(plan: SiteCheckPlan) -> int:
+            if plan.name in control.priority_sites or plan.category in control.priority_categories:
+                return 0
+            return 1
+
+        def schedule(plans: List[SiteCheckPlan]):
+            for plan in plans:
+                if plan.name not in scheduled:
+                    scheduled[plan.name] = len(scheduled)
+                    heapq.heappush(pending, (rank(plan), scheduled[plan.name], plan))
+
+        def start(coro):
+            nonlocal in_flight
+            in_flight += 1
+            task = asyncio.create_task(coro)
+            tasks.add(task)
+            task.add_done_callback(task_done)
+
+        def launch():
+            # Only a window of sites runs at once so steering can still reorder the rest
+            while pending and in_flight < window:
+                start(process_site(heapq.heappop(pending)[2]))
+
+        def maybe_finish():
+            nonlocal drained
+            if in_flight == 0 and not pending and not drained:
+                drained = True
+                # Sorts after every event, so it is only seen once the queue is drained
+                result_queue.put_nowait((drain_priority, queue_sequence, None))
+
+        def task_done(task: asyncio.Task):
+            nonlocal in_flight
+            in_flight -= 1
+            tasks.discard(task)
+            if not control.cancelled:
+                launch()
+            maybe_finish()
+
+        def on_control():
+            if drained:
+                return
+            if control.cancelled:
+                pending.clear()
+                for task in list(tasks):
+                    task.cancel()
+                maybe_finish()
+                return
+            schedule([site_index[name] for name in control.take_added() if name in site_index])
+            pending[:] = [(rank(plan), order, plan) for _, order, plan in pending]
+            heapq.heapify(pending)
+            launch()
+
+        async with self._session_scope(shared_session) as session:
+            schedule(sites)
             if include_duckduckgo:
-                ddg_task = asyncio.create_task(
-                    self.stream_duckduckgo_search(session, username, queue_event)
-                )
-                tasks.append(ddg_task)
-
-            while any(not task.done() for task in tasks) or not result_queue.empty():
-                try:
-                    _, _, event = await asyncio.wait_for(
-                        result_queue.get(),
-                        timeout=1.0
-                    )
-
-                    if event.event_type == EventType.SITE_RESULT:
-                        checked_count += 1
-                        site_data = event.data
-
-                        if site_data["status"] == CheckStatus.FOUND.value:
-                            found_count += 1
-                        elif site_data["status"] == CheckStatus.NOT_FOUND.value:
-                            not_found_count += 1
-                        else:
-                            error_count += 1
-
-                        event.data["progress"] = {
-                            "checked": checked_count,
-                            "total": len(sites),
-                            "found": found_count,
-                            "not_found": not_found_count,
-                            "errors": error_count,
-                            "percentage": round((checked_count / len(sites)) * 100, 2)
-                        }
-
-                    yield event
-
-                    if event.event_type == EventType.DUCKDUCKGO_RESULT and self.stream_delay > 0:
-                        await asyncio.sleep(self.stream_delay)
-
-                except asyncio.TimeoutError:
-                    if all(task.done() for task in tasks):
-                        break
-                    continue
-
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-            while not result_queue.empty():
-                _, _, event = await result_queue.get()
-
-                if event.event_type == EventType.SITE_RESULT:
-                    checked_count += 1
-                    site_data = event.data
-
-                    if site_data["status"] == CheckStatus.FOUND.value:
-                        found_count += 1
-                    elif site_data["status"] == CheckStatus.NOT_FOUND.value:
-                        not_found_count += 1
-                    else:
-                        error_count += 1
-
-                    event.data["progress"] = {
-                        "checked": checked_count,
-                        "total": len(sites),
-                        "found": found_count,
-                        "not_found": not_found_count,
-                        "errors": error_count,
-                        "percentage": round((checked_count / len(sites)) * 100, 2)
-                    }
+                start(self.stream_duckduckgo_search(session, username, queue_event))
+            control.listen(on_control)
+            on_control()
+            maybe_finish()
+
+            def count(event: StreamEvent):
+                nonlocal checked_count, found_count, not_found_count, error_count
+                if event.event_type != EventType.SITE_RESULT:
+                    return
+                checked_count += 1
+                site_data = event.data
+
+                if site_data["status"] == CheckStatus.FOUND.value:
+                    found_count += 1
+                elif site_data["status"] == CheckStatus.NOT_FOUND.value:
+                    not_found_count += 1
+                else:
+                    error_count += 1
+
+                event.data["progress"] = {
+                    "checked": checked_count,
+                    "total": len(scheduled),
+                    "found": found_count,
+                    "not_found": not_found_count,
+                    "errors": error_count,
+                    "percentage": round((checked_count / len(scheduled)) * 100, 2)
+                }
 
-                yield event
-                if event.event_type == EventType.DUCKDUCKGO_RESULT and self.stream_delay > 0:
-                    await asyncio.sleep(self.stream_delay)
+            try:
+                finished = False
+                while not finished:
+                    # Block until something is ready, then take everything else that
+                    # arrived in the same burst so it goes out as one frame
+                    batch = []
+                    _, _, event = await result_queue.get()
+                    while True:
+                        if event is None:
+                            finished = True
+                            break
+                        count(event)
+                        batch.append(event)
+                        if len(batch) >= self.max_frame_events or result_queue.empty():
+                            break
+                        _, _, event = result_queue.get_nowait()
+                    if batch:
+                        yield batch
+
+                await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                control.listen(None)
+                for task in list(tasks):
+                    task.cancel()
+                if self.result_cache:
+                    await self.result_cache.flush()
 
         # Yield completion event
         elapsed_time = time.time() - start_time
-        yield StreamEvent(
+        yield [StreamEvent(
             event_type=EventType.SEARCH_COMPLETED,
             data={
                 "search_id": search_id,
@@ -816,7 +1346,127 @@ class StreamingUsernameSearchService:
                 "total_not_found": not_found_count,
                 "total_errors": error_count,
                 "total_checked": checked_count,
+                "total_cached": len(cached_results),
+                "total_sites": len(scheduled),
+                "cancelled": control.cancelled,
+                "connections": connection_stats.to_dict(),
+                "retries": retry_budget.to_dict(),
                 "search_time_seconds": round(elapsed_time, 2),
                 "success_rate": round((found_count / checked_count) * 100, 2) if checked_count > 0 else 0
             }
-        )
+        )]
+
+    async def stream_batch_search(self,
+                                  usernames: List[str],
+                                  include_duckduckgo: bool = False,
+                                  extract_profile: bool = False,
+                                  categories: Optional[List[str]] = None,
+                                  priority_sites: Optional[List[str]] = None,
+                                  refresh: Optional[List[str]] = None) -> AsyncGenerator[StreamEvent, None]:
+        """Batch search one event at a time (see stream_batch_search_batches)"""
+        async for batch in self.stream_batch_search_batches(
+            usernames=usernames,
+            include_duckduckgo=include_duckduckgo,
+            extract_profile=extract_profile,
+            categories=categories,
+            priority_sites=priority_sites,
+            refresh=refresh
+        ):
+            for event in batch:
+                yield event
+
+    async def stream_batch_search_batches(self,
+                                          usernames: List[str],
+                                          include_duckduckgo: bool = False,
+                                          extract_profile: bool = False,
+                                          categories: Optional[List[str]] = None,
+                                          priority_sites: Optional[List[str]] = None,
+                                          refresh: Optional[List[str]] = None) -> AsyncGenerator[List[StreamEvent], None]:
+        """
+        Search several usernames over one pooled session.
+
+        Every per-username search shares the connector (so DNS and TLS are paid
+        once per host) and the service-wide semaphore and rate limiter. Events are
+        interleaved as they arrive, each one carries its "username", and batches
+        that are ready at the same time are merged into one list.
+        """
+        batch_id = str(uuid.uuid4())
+        start_time = time.time()
+        usernames = list(dict.fromkeys(u.strip() for u in usernames if u and u.strip()))
+
+        yield [StreamEvent(
+            event_type=EventType.BATCH_STARTED,
+            data={
+                "batch_id": batch_id,
+                "usernames": usernames,
+                "total_usernames": len(usernames),
+                "categories": categories,
+                "include_duckduckgo": include_duckduckgo,
+                "extract_profile": extract_profile
+            }
+        )]
+
+        event_queue: asyncio.Queue = asyncio.Queue()
+        summaries = {}
+        done_marker = object()
+
+        async def pump(username: str, session: aiohttp.ClientSession):
+            try:
+                async for batch in self.stream_search_batches(
+                    username=username,
+                    include_duckduckgo=include_duckduckgo,
+                    extract_profile=extract_profile,
+                    categories=categories,
+                    priority_sites=priority_sites,
+                    refresh=refresh,
+                    shared_session=session
+                ):
+                    for event in batch:
+                        event.data["username"] = username
+                        event.data["batch_id"] = batch_id
+                        if event.event_type == EventType.SEARCH_COMPLETED:
+                            summaries[username] = event.data
+                    await event_queue.put(batch)
+            except Exception as e:
+                logger.error(f"Batch search for {username} failed: {e}")
+                await event_queue.put([StreamEvent(
+                    event_type=EventType.ERROR,
+                    data={"username": username, "batch_id": batch_id, "message": str(e)}
+                )])
+            finally:
+                await event_queue.put(done_marker)
+
+        async with self.create_session() as session:
+            tasks = [asyncio.create_task(pump(username, session)) for username in usernames]
+            try:
+                remaining = len(tasks)
+                while remaining:
+                    merged = []
+                    item = await event_queue.get()
+                    while True:
+                        if item is done_marker:
+                            remaining -= 1
+                        else:
+                            merged.extend(item)
+                        if len(merged) >= self.max_frame_events or event_queue.empty():
+                            break
+                        item = event_queue.get_nowait()
+                    if merged:
+                        yield merged
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        yield [StreamEvent(
+            event_type=EventType.BATCH_COMPLETED,
+            data={
+                "batch_id": batch_id,
+                "total_usernames": len(usernames),
+                "total_found": sum(s["total_found"] for s in summaries.values()),
+                "total_checked": sum(s["total_checked"] for s in summaries.values()),
+                "found_by_username": {u: s["total_found"] for u, s in summaries.items()},
+                "search_time_seconds": round(time.time() - start_time, 2)
+            }
+        )]
@@ -0,0 +1,558 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import AsyncGenerator, Dict, List, Optional, Set
+
+from services.profile_extractor import ProfileExtractor
+from services.site_latency_profile import SiteLatencyProfile
+from services.username_result_cache import SQLiteResultCache
+from services.username_service import (
+    CheckStatus,
+    EventType,
+    SearchControl,
+    StreamEvent,
+    StreamingUsernameSearchService,
+)
+from services.wmn_metadata_store import WMNMetadataStore
+from services.wmn_site_plan import SiteCheckPlan
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(plan: SiteCheckPlan) -> str:
+    """Sites on one host share a shard, so per-host rate limits and pools stay in one process"""
+    uri = plan.site.get("uri_check", "")
+    host = uri.split("://", 1)[-1].split("/", 1)[0]
+    return host.lower() or plan.name
+
+
+def _encode(events: List[StreamEvent]) -> list:
+    return [[event.event_type.value, event.data, event.timestamp] for event in events]
+
+
+def _decode(items: list) -> List[StreamEvent]:
+    return [StreamEvent(EventType(event_type), data, timestamp) for event_type, data, timestamp in items]
+
+
+# ── worker process ──────────────────────────────────────────────
+
+def _shard_main(conn, options: dict):
+    # The parent handles Ctrl+C and stops the pool; workers must not die first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=options.get("log_level", logging.INFO))
+    asyncio.run(_ShardWorker(conn, options).run())
+
+
+class _ShardWorker:
+    """One shard: its own event loop, connection pool and search service"""
+
+    def __init__(self, conn, options: dict):
+        self.conn = conn
+        self.options = options
+        self.searches: Dict[str, tuple] = {}
+        self.outbox: "queue.SimpleQueue" = queue.SimpleQueue()
+
+    def _service(self) -> StreamingUsernameSearchService:
+        options = self.options
+        return StreamingUsernameSearchService(
+            max_concurrent_requests=options["max_concurrent_requests"],
+            timeout_seconds=options["timeout_seconds"],
+            max_retries=options["max_retries"],
+            metadata_store=WMNMetadataStore(
+                snapshot_path=Path(options["snapshot_path"]),
+                refresh_interval=float("inf")
+            ),
+            result_cache=SQLiteResultCache(Path(options["result_cache_path"])) if options["result_cache_path"] else None,
+            latency_profile=SiteLatencyProfile(path=Path(options["latency_profile_path"])),
+            # The shard is already one of many processes; a nested pool would oversubscribe cores
+            profile_extractor=ProfileExtractor(workers=0),
+            http2=options["http2"],
+            hedge_requests=options["hedge_requests"],
+        )
+
+    def _read_commands(self, loop: asyncio.AbstractEventLoop, inbox: asyncio.Queue):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                message = ("stop",)
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message[0] == "stop":
+                return
+
+    def _write_messages(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                return
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                return
+
+    async def run(self):
+        self.service = self._service()
+        await self.service.latency_profile.load()
+
+        loop = asyncio.get_running_loop()
+        inbox: asyncio.Queue = asyncio.Queue()
+        threading.Thread(target=self._read_commands, args=(loop, inbox), daemon=True).start()
+        writer = threading.Thread(target=self._write_messages, daemon=True)
+        writer.start()
+        self.outbox.put(("ready", os.getpid()))
+
+        try:
+            while True:
+                command, *args = await inbox.get()
+                if command == "stop":
+                    break
+                if command == "start":
+                    search_id = args[0]
+                    control = SearchControl()
+                    task = asyncio.create_task(self._search(control, *args))
+                    self.searches[search_id] = (task, control)
+                    continue
+                entry = self.searches.get(args[0])
+                if entry is None:
+                    continue
+                _, control = entry
+                if command == "cancel":
+                    control.cancel()
+                elif command == "prioritize":
+                    control.prioritize(args[1], args[2])
+                elif command == "add_sites":
+                    control.add_sites(args[1])
+        finally:
+            for task, _ in list(self.searches.values()):
+                task.cancel()
+            await asyncio.gather(*[task for task, _ in self.searches.values()], return_exceptions=True)
+            if self.service.http2_client:
+                await self.service.http2_client.aclose()
+            self.outbox.put(None)
+            await asyncio.to_thread(writer.join, 5)
+
+    async def _search(self, control: SearchControl, search_id: str, username: str,
+                      params: dict, site_names: List[str], metadata_version: Optional[str]):
+        try:
+            store = self.service.metadata_store
+            if metadata_version and store.version != metadata_version:
+                await store.reload_from_disk()
+            async for batch in self.service.stream_search_batches(
+                username,
+                search_id=search_id,
+                control=control,
+                site_names=site_names,
+                **params
+            ):
+                self.outbox.put(("events", search_id, _encode(batch)))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Shard search {search_id} failed: {e}")
+            self.outbox.put(("error", search_id, str(e)))
+        finally:
+            self.searches.pop(search_id, None)
+            self.outbox.put(("done", search_id))
+
+
+# ── parent side ─────────────────────────────────────────────────
+
+class _ShardHandle:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.alive = True
+        self.lost = False
+        self.ready = asyncio.get_running_loop().create_future()
+        self.searches: Set[str] = set()
+        self._send_lock = threading.Lock()
+
+    def send(self, message: tuple) -> bool:
+        if not self.alive:
+            return False
+        try:
+            with self._send_lock:
+                self.conn.send(message)
+            return True
+        except (BrokenPipeError, OSError):
+            self.alive = False
+            return False
+
+
+class ShardedSearchPool:
+    """
+    Runs each username search across a pool of worker processes.
+
+    Sites are split by host (see shard_key) so every shard keeps its own
+    rate limiter, semaphore and connection pool for the hosts it owns. Each
+    worker runs a full StreamingUsernameSearchService on its own event loop,
+    so TLS, matching and profile parsing use all cores. The shards' event
+    batches are merged into one stream with the same shape as
+    StreamingUsernameSearchService.stream_search_batches: one SEARCH_STARTED,
+    SITE_RESULT progress counted across shards, one SEARCH_COMPLETED.
+
+    Workers read WMN metadata, the result cache and the latency profile from
+    the parent service's files; the parent keeps refreshing and persisting
+    them. Per-site latencies from shard results are recorded in the parent's
+    profile so ordering and timeouts keep learning.
+    """
+
+    def __init__(self,
+                 service: StreamingUsernameSearchService,
+                 shards: Optional[int] = None,
+                 max_concurrent_per_shard: Optional[int] = None):
+        self.service = service
+        self.shards = shards or os.cpu_count() or 1
+        self.max_concurrent_per_shard = max_concurrent_per_shard or service.max_concurrent_requests
+        self._handles: List[_ShardHandle] = []
+        self._streams: Dict[str, asyncio.Queue] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._options_cache: Optional[dict] = None
+        self._crashes: Dict[int, int] = {}
+        self.searches_started = 0
+        self.shard_failures = 0
+
+    @property
+    def started(self) -> bool:
+        return any(handle.alive for handle in self._handles)
+
+    def _options(self) -> dict:
+        service = self.service
+        result_cache = service.result_cache
+        return {
+            "max_concurrent_requests": self.max_concurrent_per_shard,
+            "timeout_seconds": service.timeout_seconds,
+            "max_retries": service.max_retries,
+            "snapshot_path": str(service.metadata_store.snapshot_path),
+            "result_cache_path": str(result_cache.path) if isinstance(result_cache, SQLiteResultCache) else None,
+            "latency_profile_path": str(service.latency_profile.path),
+            "http2": service.http2_client is not None,
+            "hedge_requests": service.hedge_requests,
+            "log_level": logging.getLogger().level,
+        }
+
+    async def start(self):
+        """Spawn the shard processes and wait until each has its service up"""
+        if self.started:
+            return
+        self._loop = asyncio.get_running_loop()
+        # Workers load the snapshot from disk; make sure the parent has one
+        await self.service.metadata_store.get()
+        self._options_cache = self._options()
+        self._handles = [self._spawn(index) for index in range(self.shards)]
+        await asyncio.gather(*[handle.ready for handle in self._handles], return_exceptions=True)
+        logger.info(f"Started {len(self._alive())}/{self.shards} username search shards")
+
+    def _spawn(self, index: int) -> _ShardHandle:
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_shard_main,
+            args=(child_conn, self._options_cache),
+            name=f"username-shard-{index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        handle = _ShardHandle(index, process, parent_conn)
+        threading.Thread(target=self._read_shard, args=(handle,), daemon=True).start()
+        return handle
+
+    async def _respawn(self, index: int):
+        # Back off on repeated crashes so a broken environment does not fork-bomb
+        crashes = self._crashes[index] = self._crashes.get(index, 0) + 1
+        await asyncio.sleep(min(60, 2 ** (crashes - 1)))
+        if not self._handles:
+            return
+        handle = self._spawn(index)
+        self._handles[index] = handle
+        try:
+            await handle.ready
+        except RuntimeError:
+            return
+        self._crashes[index] = 0
+        logger.info(f"Restarted username search shard {index}")
+
+    async def stop(self):
+        handles, self._handles = self._handles, []
+        for handle in handles:
+            handle.send(("stop",))
+        for handle in handles:
+            await asyncio.to_thread(handle.process.join, 10)
+            if handle.process.is_alive():
+                handle.process.terminate()
+            handle.alive = False
+            handle.conn.close()
+
+    def _read_shard(self, handle: _ShardHandle):
+        while True:
+            try:
+                message = handle.conn.recv()
+            except (EOFError, OSError):
+                self._loop.call_soon_threadsafe(self._shard_lost, handle)
+                return
+            self._loop.call_soon_threadsafe(self._dispatch, handle, message)
+
+    def _dispatch(self, handle: _ShardHandle, message: tuple):
+        if message[0] == "ready":
+            if not handle.ready.done():
+                handle.ready.set_result(message[1])
+            return
+        stream = self._streams.get(message[1])
+        if stream is not None:
+            stream.put_nowait((handle.index, message))
+
+    def _shard_lost(self, handle: _ShardHandle):
+        if handle.lost:
+            return
+        handle.lost = True
+        handle.alive = False
+        if not handle.ready.done():
+            handle.ready.set_exception(RuntimeError(f"Shard {handle.index} exited during startup"))
+        if self._handles and self._handles[handle.index] is handle:
+            self.shard_failures += 1
+            logger.error(f"Username search shard {handle.index} exited, restarting")
+            asyncio.ensure_future(self._respawn(handle.index))
+        for search_id in list(handle.searches):
+            stream = self._streams.get(search_id)
+            if stream is not None:
+                stream.put_nowait((handle.index, ("error", search_id, "shard process exited")))
+                stream.put_nowait((handle.index, ("done", search_id)))
+
+    def _alive(self) -> List[int]:
+        return [handle.index for handle in self._handles if handle.alive]
+
+    def _shard_for(self, plan: SiteCheckPlan, alive: List[int]) -> int:
+        return alive[zlib.crc32(shard_key(plan).encode()) % len(alive)]
+
+    async def stream_search_batches(self,
+                                    username: str,
+                                    include_duckduckgo: bool = False,
+                                    extract_profile: bool = False,
+                                    categories: Optional[List[str]] = None,
+                                    priority_sites: Optional[List[str]] = None,
+                                    refresh: Optional[List[str]] = None,
+                                    search_id: Optional[str] = None,
+                                    control: Optional[SearchControl] = None) -> AsyncGenerator[List[StreamEvent], None]:
+        """Same events and options as StreamingUsernameSearchService.stream_search_batches, run on the shards"""
+        if not self.started:
+            raise RuntimeError("Sharded search pool is not running")
+
+        search_id = search_id or str(uuid.uuid4())
+        start_time = time.time()
+        self.searches_started += 1
+
+        metadata_index = await self.service.get_site_index()
+        site_index = metadata_index.by_name
+        sites = metadata_index.select(categories)
+        alive = self._alive()
+        assignment: Dict[int, List[str]] = {}
+        for plan in sites:
+            assignment.setdefault(self._shard_for(plan, alive), []).append(plan.name)
+        if include_duckduckgo and not assignment:
+            assignment[alive[0]] = []
+        handles = {handle.index: handle for handle in self._handles}
+        shard_of = {name: index for index, names in assignment.items() for name in names}
+
+        stream: asyncio.Queue = asyncio.Queue()
+        self._streams[search_id] = stream
+        active = set()
+        metadata_version = self.service.metadata_store.version
+        for position, (index, names) in enumerate(sorted(assignment.items())):
+            params = {
+                "include_duckduckgo": include_duckduckgo and position == 0,
+                "extract_profile": extract_profile,
+                "priority_sites": priority_sites,
+                "refresh": refresh,
+            }
+            handle = handles[index]
+            if handle.send(("start", search_id, username, params, names, metadata_version)):
+                handle.searches.add(search_id)
+                active.add(index)
+
+        control = control or SearchControl()
+
+        def broadcast(*message):
+            for index in active:
+                handles[index].send(message)
+
+        priorities = ([], [])
+
+        def on_control():
+            nonlocal priorities
+            if control.cancelled:
+                broadcast("cancel", search_id)
+                return
+            added: Dict[int, List[str]] = {}
+            for name in control.take_added():
+                plan = site_index.get(name)
+                if plan is None or name in shard_of:
+                    continue
+                index = self._shard_for(plan, alive)
+                if index in active:
+                    shard_of[name] = index
+                    added.setdefault(index, []).append(name)
+            for index, names in added.items():
+                handles[index].send(("add_sites", search_id, names))
+            current = (sorted(control.priority_categories), sorted(control.priority_sites))
+            if current != priorities:
+                priorities = current
+                broadcast("prioritize", search_id, *current)
+
+        started_pending = set(active)
+        started: List[dict] = []
+        completed: List[dict] = []
+        held: List[StreamEvent] = []
+        errors: List[StreamEvent] = []
+        found_count = not_found_count = error_count = checked_count = 0
+
+        def count(event: StreamEvent):
+            nonlocal checked_count, found_count, not_found_count, error_count
+            checked_count += 1
+            data = event.data
+            if data["status"] == CheckStatus.FOUND.value:
+                found_count += 1
+            elif data["status"] == CheckStatus.NOT_FOUND.value:
+                not_found_count += 1
+            else:
+                error_count += 1
+            if not data.get("cached"):
+                self.service.latency_profile.record(
+                    data["site_name"], data.get("response_time"),
+                    timed_out=data.get("error_message") == "Timeout"
+                )
+            total = max(len(shard_of), checked_count)
+            data["progress"] = {
+                "checked": checked_count,
+                "total": total,
+                "found": found_count,
+                "not_found": not_found_count,
+                "errors": error_count,
+                "percentage": round((checked_count / total) * 100, 2)
+            }
+
+        def merged_started() -> StreamEvent:
+            return StreamEvent(
+                event_type=EventType.SEARCH_STARTED,
+                data={
+                    "search_id": search_id,
+                    "username": username,
+                    "total_sites": len(shard_of),
+                    "categories": categories,
+                    "include_duckduckgo": include_duckduckgo,
+                    "extract_profile": extract_profile,
+                    "cached_sites": sum(data.get("cached_sites", 0) for data in started),
+                    "shards": len(active)
+                }
+            )
+
+        def take(index: int, message: tuple) -> List[StreamEvent]:
+            kind = message[0]
+            if kind == "done":
+                active.discard(index)
+                started_pending.discard(index)
+                handles[index].searches.discard(search_id)
+                return []
+            if kind == "error":
+                started_pending.discard(index)
+                event = StreamEvent(
+                    event_type=EventType.ERROR,
+                    data={"search_id": search_id, "message": f"Shard {index}: {message[2]}"}
+                )
+                errors.append(event)
+                return [event]
+            events = []
+            for event in _decode(message[2]):
+                if event.event_type == EventType.SEARCH_STARTED:
+                    started.append(event.data)
+                    started_pending.discard(index)
+                elif event.event_type == EventType.SEARCH_COMPLETED:
+                    completed.append(event.data)
+                else:
+                    if event.event_type == EventType.SITE_RESULT:
+                        count(event)
+                    events.append(event)
+            return events
+
+        control.listen(on_control)
+        on_control()
+        announced = False
+        try:
+            while active:
+                batch = []
+                index, message = await stream.get()
+                while True:
+                    batch.extend(take(index, message))
+                    if len(batch) >= self.service.max_frame_events or stream.empty():
+                        break
+                    index, message = stream.get_nowait()
+
+                if not announced:
+                    held.extend(batch)
+                    if started_pending:
+                        continue
+                    announced = True
+                    batch, held = [merged_started()] + held, []
+                if batch:
+                    yield batch
+            if not announced:
+                yield [merged_started()] + held
+        finally:
+            control.listen(None)
+            if active:
+                broadcast("cancel", search_id)
+            for index in active:
+                handles[index].searches.discard(search_id)
+            del self._streams[search_id]
+
+        def total(key: str) -> int:
+            return sum(data.get(key, 0) for data in completed)
+
+        def summed(key: str) -> dict:
+            merged: Dict[str, int] = {}
+            for data in completed:
+                for name, value in (data.get(key) or {}).items():
+                    merged[name] = merged.get(name, 0) + value
+            return merged
+
+        elapsed_time = time.time() - start_time
+        yield [StreamEvent(
+            event_type=EventType.SEARCH_COMPLETED,
+            data={
+                "search_id": search_id,
+                "username": username,
+                "total_found": found_count,
+                "total_not_found": not_found_count,
+                "total_errors": error_count,
+                "total_checked": checked_count,
+                "total_cached": total("total_cached"),
+                "total_sites": len(shard_of),
+                "cancelled": control.cancelled,
+                "shards": len(completed),
+                "shard_errors": len(errors),
+                "connections": summed("connections"),
+                "retries": summed("retries"),
+                "search_time_seconds": round(elapsed_time, 2),
+                "success_rate": round((found_count / checked_count) * 100, 2) if checked_count > 0 else 0
+            }
+        )]
+
+    def stats(self) -> dict:
+        return {
+            "shards": len(self._handles),
+            "alive": sum(1 for handle in self._handles if handle.alive),
+            "pids": [handle.process.pid for handle in self._handles],
+            "max_concurrent_per_shard": self.max_concurrent_per_shard,
+            "running_searches": len(self._streams),
+            "searches_started": self.searches_started,
+            "shard_failures": self.shard_failures,
+        }
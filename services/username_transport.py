@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp import ClientTimeout
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    import httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+
+class HTTP2Unsupported(aiohttp.ClientError):
+    """The host broke the HTTP/2 protocol; it has been moved to HTTP/1.1"""
+
+
+class ConnectionStats:
+    """New connections (handshakes) and requests per protocol for one search"""
+    __slots__ = ("h1_connections", "h2_connections", "h1_requests", "h2_requests", "h2_fallbacks")
+
+    def __init__(self):
+        self.h1_connections = 0
+        self.h2_connections = 0
+        self.h1_requests = 0
+        self.h2_requests = 0
+        self.h2_fallbacks = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "handshakes": self.h1_connections + self.h2_connections,
+            "h1_connections": self.h1_connections,
+            "h2_connections": self.h2_connections,
+            "h1_requests": self.h1_requests,
+            "h2_requests": self.h2_requests,
+            "h2_fallbacks": self.h2_fallbacks,
+        }
+
+
+class CheckResponse:
+    """The parts of a response a site check reads, independent of the client library"""
+    __slots__ = ("status", "headers", "redirect_statuses", "http_version", "_chunks")
+
+    def __init__(self, status: int, headers, redirect_statuses: List[int], http_version: str, chunks):
+        self.status = status
+        self.headers = headers
+        self.redirect_statuses = redirect_statuses
+        self.http_version = http_version
+        self._chunks = chunks
+
+    def iter_chunks(self, size: int) -> AsyncIterator[bytes]:
+        return self._chunks(size)
+
+
+async def _count_connection(session, trace_config_ctx, params):
+    stats = trace_config_ctx.trace_request_ctx
+    if isinstance(stats, ConnectionStats):
+        stats.h1_connections += 1
+
+
+def connection_trace_config() -> aiohttp.TraceConfig:
+    """aiohttp trace hook that credits new connections to the request's ConnectionStats"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(_count_connection)
+    return trace_config
+
+
+@asynccontextmanager
+async def open_http1(session: aiohttp.ClientSession,
+                     method: str,
+                     url: str,
+                     headers: Dict[str, str],
+                     timeout: ClientTimeout,
+                     body: dict,
+                     stats: Optional[ConnectionStats]):
+    """Site check request over the pooled aiohttp session"""
+    if stats is not None:
+        stats.h1_requests += 1
+    async with session.request(
+        method,
+        url,
+        headers=headers,
+        timeout=timeout,
+        allow_redirects=True,
+        ssl=False,
+        trace_request_ctx=stats,
+        **body
+    ) as response:
+        yield CheckResponse(
+            status=response.status,
+            headers=response.headers,
+            redirect_statuses=[history_response.status for history_response in response.history],
+            http_version=f"HTTP/{response.version.major}.{response.version.minor}" if response.version else "HTTP/1.1",
+            chunks=response.content.iter_chunked
+        )
+
+
+class HTTP2Client:
+    """
+    Multiplexed HTTP/2 transport for HTTPS site checks (httpx + h2).
+
+    One connection per origin carries every check to that host. A host that
+    negotiates HTTP/1.1 or breaks the HTTP/2 protocol is remembered and sent
+    back to the aiohttp pool for the rest of the process lifetime. Cookies are
+    not kept between requests, matching a fresh aiohttp session per search
+    more closely than a shared jar would.
+    """
+
+    def __init__(self, max_connections: int = 100):
+        if not HTTP2_AVAILABLE:
+            raise RuntimeError("HTTP/2 transport needs httpx and h2 (pip install 'httpx[http2]')")
+        self.max_connections = max_connections
+        self.http1_hosts: Set[str] = set()
+        self._client = None
+        self._streams = weakref.WeakSet()
+
+    def _get_client(self):
+        if self._client is None:
+            from http.cookiejar import CookieJar, DefaultCookiePolicy
+            self._client = httpx.AsyncClient(
+                http2=True,
+                verify=False,
+                follow_redirects=True,
+                trust_env=True,
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+                limits=httpx.Limits(max_connections=self.max_connections)
+            )
+        return self._client
+
+    def handles(self, url: str) -> bool:
+        parsed = urlparse(url)
+        return parsed.scheme == "https" and parsed.netloc not in self.http1_hosts
+
+    def fall_back(self, host: str, reason: str, stats: Optional[ConnectionStats] = None):
+        if host not in self.http1_hosts:
+            self.http1_hosts.add(host)
+            logger.info(f"Using HTTP/1.1 for {host}: {reason}")
+        if stats is not None:
+            stats.h2_fallbacks += 1
+
+    @asynccontextmanager
+    async def open(self,
+                   method: str,
+                   url: str,
+                   headers: Dict[str, str],
+                   timeout: float,
+                   body: dict,
+                   stats: Optional[ConnectionStats]):
+        """
+        Site check request over HTTP/2.
+
+        httpx timeouts surface as asyncio.TimeoutError and transport failures
+        as aiohttp.ClientError, so callers handle both transports the same way.
+        Protocol errors move the host to HTTP/1.1 and raise HTTP2Unsupported;
+        when that happens before the response, the caller can simply retry
+        over HTTP/1.1.
+        """
+        host = urlparse(url).netloc
+        request_kwargs = dict(body)
+        if isinstance(request_kwargs.get("data"), str):
+            request_kwargs["content"] = request_kwargs.pop("data")
+
+        try:
+            async with self._get_client().stream(
+                method, url, headers=headers, timeout=timeout, **request_kwargs
+            ) as response:
+                stream = response.extensions.get("network_stream")
+                if stats is not None:
+                    if response.http_version == "HTTP/2":
+                        stats.h2_requests += 1
+                    else:
+                        stats.h1_requests += 1
+                    if stream is not None and stream not in self._streams:
+                        if response.http_version == "HTTP/2":
+                            stats.h2_connections += 1
+                        else:
+                            stats.h1_connections += 1
+                if stream is not None:
+                    self._streams.add(stream)
+                if response.http_version != "HTTP/2":
+                    self.fall_back(host, f"server negotiated {response.http_version}", stats)
+
+                yield CheckResponse(
+                    status=response.status_code,
+                    headers=response.headers,
+                    redirect_statuses=[history_response.status_code for history_response in response.history],
+                    http_version=response.http_version,
+                    chunks=response.aiter_bytes
+                )
+        except httpx.TimeoutException as e:
+            raise asyncio.TimeoutError() from e
+        except (httpx.RemoteProtocolError, httpx.LocalProtocolError) as e:
+            self.fall_back(host, f"protocol error: {e}", stats)
+            raise HTTP2Unsupported(f"HTTP/2 protocol error: {e}") from e
+        except httpx.HTTPError as e:
+            raise aiohttp.ClientError(str(e)) from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def state(self) -> dict:
+        return {"http1_hosts": sorted(self.http1_hosts)}
@@ -12,6 +12,8 @@ from abc import ABC, abstractmethod
 import re
 import logging
 
+from services.dns_cache import connector
+
 logger = logging.getLogger(__name__)
 
 
@@ -272,7 +274,7 @@ class SearchExecutor:
 
         close_session = False
         if session is None:
-            session = aiohttp.ClientSession()
+            session = aiohttp.ClientSession(connector=connector())
             close_session = True
 
         try:
@@ -297,7 +299,7 @@ class SearchExecutor:
         """Execute multiple searches with rate limiting"""
 
         results = []
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(connector=connector()) as session:
             for dork in dorks:
                 try:
                     result = await self.search(dork, engine, max_results, session)
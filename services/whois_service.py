@@ -6,6 +6,7 @@ import aiohttp
 from fastapi import HTTPException
 
 from config.token_manager import tokens
+from services.dns_cache import connector
 
 class WhoisService:
     def __init__(self):
@@ -15,7 +16,7 @@ class WhoisService:
         self.wx_api_key = tokens.get("WHOIS_XML_API_KEY")
 
     async def lookup_whois_history(self, domain: str):
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(connector=connector()) as session:
             params = {
                 'apiKey': self.wx_api_key,
                 'domainName': domain,
@@ -28,7 +29,7 @@ class WhoisService:
                 return data
 
     async def lookup_whois(self, domain: str):
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(connector=connector()) as session:
             async with session.post(f'http://{self.domain}{self.uri}', json={"address": domain}) as resp:
                 if resp.status != 200:
                     raise HTTPException(status_code=resp.status, detail="WHOIS lookup failed")
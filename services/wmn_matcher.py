@@ -0,0 +1,135 @@
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Characters that give a WMN marker regex meaning beyond a literal string
+_REGEX_META = frozenset("()[]{}?*+|^$\\.")
+
+
+@lru_cache(maxsize=4096)
+def _compile_pattern(pattern: str) -> Optional[re.Pattern]:
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def is_plain_pattern(pattern: Optional[str]) -> bool:
+    """True when a marker's regex form is just a case-insensitive literal"""
+    return bool(pattern) and not any(ch in _REGEX_META for ch in pattern)
+
+
+class PatternMatcher:
+    """
+    WMN e_string/m_string rule.
+    None never matches, "" means "status-code-only" and always matches,
+    otherwise a literal substring or case-insensitive regex hit.
+
+    Plain markers skip the regex engine entirely: a case-insensitive regex of a
+    literal is the same test as a substring search over case-folded text.
+    """
+    __slots__ = ("pattern", "folded", "regex")
+
+    def __init__(self, pattern: Optional[str]):
+        self.pattern = pattern
+        self.folded = pattern.lower() if is_plain_pattern(pattern) else None
+        self.regex = _compile_pattern(pattern) if pattern and self.folded is None else None
+
+    def search(self, text: str, folded_text: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """Match against text, reusing (and returning) the case-folded body"""
+        pattern = self.pattern
+        if pattern is None:
+            return False, folded_text
+        if pattern == "" or pattern in text:
+            return True, folded_text
+        if self.folded is not None:
+            if folded_text is None:
+                folded_text = text.lower()
+            return self.folded in folded_text, folded_text
+        return bool(self.regex and self.regex.search(text)), folded_text
+
+    def matches(self, text: str) -> bool:
+        return self.search(text)[0]
+
+
+class SiteMatcher:
+    """
+    Both markers of one site, evaluated over a single case-folded copy of the body.
+    m_string is checked first and short-circuits, mirroring WMN precedence.
+    """
+    __slots__ = ("e", "m")
+
+    def __init__(self, e_string: Optional[str], m_string: Optional[str]):
+        self.e = PatternMatcher(e_string)
+        self.m = PatternMatcher(m_string)
+
+    def evaluate(self, text: str, need_m: bool, need_e: bool) -> Tuple[bool, bool]:
+        """Return (m_hit, e_hit) for the markers whose status code matched"""
+        folded_text = None
+        if need_m:
+            m_hit, folded_text = self.m.search(text, folded_text)
+            if m_hit:
+                return True, False
+        if need_e:
+            e_hit, _ = self.e.search(text, folded_text)
+            return False, e_hit
+        return False, False
+
+
+class StreamingMatch:
+    """
+    Incremental SiteMatcher evaluation over body chunks.
+
+    Plain markers are searched chunk by chunk (with a small overlap so a marker
+    split across chunks is still seen) and the scan reports as soon as the
+    verdict can no longer change. Regex markers are not streamable; callers
+    buffer the body and fall back to SiteMatcher.evaluate.
+    """
+    __slots__ = ("need_m", "need_e", "m_hit", "e_hit", "streamable", "_m", "_e", "_tail", "_overlap")
+
+    def __init__(self, matcher: SiteMatcher, need_m: bool, need_e: bool):
+        self._m = matcher.m
+        self._e = matcher.e
+        # A None marker never matches, so it cannot influence the verdict
+        self.need_m = need_m and self._m.pattern is not None
+        self.need_e = need_e and self._e.pattern is not None
+        self.m_hit = self.need_m and self._m.pattern == ""
+        self.e_hit = self.need_e and self._e.pattern == ""
+        self.streamable = all(
+            marker.pattern == "" or marker.folded is not None
+            for marker, needed in ((self._m, self.need_m), (self._e, self.need_e))
+            if needed
+        )
+        self._overlap = max(
+            (len(marker.folded) - 1 for marker in (self._m, self._e) if marker.folded),
+            default=0
+        )
+        self._tail = ""
+
+    @property
+    def decided(self) -> bool:
+        """True once more body text cannot change the outcome"""
+        if self.m_hit:
+            return True
+        if self.need_m:
+            return False
+        return self.e_hit or not self.need_e
+
+    def result(self) -> Tuple[bool, bool]:
+        """(m_hit, e_hit) with m_string taking precedence"""
+        if self.m_hit:
+            return True, False
+        return False, self.e_hit
+
+    def feed(self, text: str) -> bool:
+        """Scan the next decoded chunk; returns decided"""
+        if self.decided or not self.streamable or not text:
+            return self.decided
+
+        window = self._tail + text.lower()
+        if self.need_m and not self.m_hit and self._m.folded in window:
+            self.m_hit = True
+        if self.need_e and not self.e_hit and self._e.folded in window:
+            self.e_hit = True
+        self._tail = window[-self._overlap:] if self._overlap else ""
+        return self.decided
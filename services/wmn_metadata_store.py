@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import aiohttp
+from aiohttp import ClientTimeout
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+WMN_DATA_URL = "https://raw.githubusercontent.com/WebBreacher/WhatsMyName/refs/heads/main/wmn-data.json"
+DEFAULT_SNAPSHOT_PATH = Path(__file__).parent.parent / "cache" / "wmn-data.json"
+
+
+@dataclass(frozen=True)
+class MetadataSnapshot:
+    """Immutable view of one WMN metadata version"""
+    data: dict
+    version: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    def to_meta(self) -> dict:
+        return {
+            "version": self.version,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched_at": self.fetched_at,
+        }
+
+
+class WMNMetadataStore:
+    """
+    WhatsMyName metadata with an on-disk snapshot and background refresh.
+
+    Readers always get the current in-memory snapshot. Refreshes use
+    conditional requests (ETag / If-Modified-Since) and replace the snapshot
+    reference in one assignment, so a search never sees half-updated data.
+    Disk and JSON work runs in a thread to keep the event loop free.
+    """
+
+    def __init__(self,
+                 url: str = WMN_DATA_URL,
+                 snapshot_path: Path = DEFAULT_SNAPSHOT_PATH,
+                 refresh_interval: float = 6 * 3600,
+                 timeout_seconds: int = 10,
+                 retry_backoff: float = 300):
+        self.url = url
+        self.snapshot_path = Path(snapshot_path)
+        self.meta_path = self.snapshot_path.with_suffix(".meta.json")
+        self.refresh_interval = refresh_interval
+        self.retry_backoff = retry_backoff
+        self.timeout = ClientTimeout(total=timeout_seconds)
+
+        self._snapshot: Optional[MetadataSnapshot] = None
+        self._load_lock = asyncio.Lock()
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._pending_refresh: Optional[asyncio.Task] = None
+        self._retry_after = 0.0
+
+    @property
+    def snapshot(self) -> Optional[MetadataSnapshot]:
+        return self._snapshot
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version if self._snapshot else None
+
+    async def start(self):
+        """Load the disk snapshot and start the periodic refresh loop"""
+        await self._ensure_loaded(fetch_if_missing=False)
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def get(self) -> MetadataSnapshot:
+        """
+        Return the current snapshot.
+
+        Only waits on the network when neither memory nor disk has any data.
+        A stale snapshot is returned immediately and refreshed in the background.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = await self._ensure_loaded(fetch_if_missing=True)
+
+        if time.time() - snapshot.fetched_at > self.refresh_interval:
+            self._schedule_refresh()
+
+        return snapshot
+
+    async def refresh(self) -> bool:
+        """Conditionally re-fetch upstream data. Returns True if a new version was installed"""
+        async with self._refresh_lock:
+            current = self._snapshot
+            headers = {}
+            if current and current.etag:
+                headers["If-None-Match"] = current.etag
+            if current and current.last_modified:
+                headers["If-Modified-Since"] = current.last_modified
+
+            async with aiohttp.ClientSession(timeout=self.timeout, trust_env=True) as session:
+                async with session.get(self.url, headers=headers) as response:
+                    if response.status == 304 and current:
+                        self._snapshot = MetadataSnapshot(
+                            data=current.data,
+                            version=current.version,
+                            etag=current.etag,
+                            last_modified=current.last_modified,
+                            fetched_at=time.time()
+                        )
+                        await asyncio.to_thread(self._write_meta, self._snapshot)
+                        return False
+
+                    response.raise_for_status()
+                    raw = await response.read()
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+
+            data = await asyncio.to_thread(json.loads, raw)
+            if not isinstance(data, dict) or not isinstance(data.get("sites"), list):
+                raise ValueError("Upstream WMN data has no 'sites' list")
+
+            version = hashlib.sha1(raw).hexdigest()
+            if current and current.version == version:
+                self._snapshot = MetadataSnapshot(
+                    data=current.data,
+                    version=version,
+                    etag=etag,
+                    last_modified=last_modified,
+                    fetched_at=time.time()
+                )
+                await asyncio.to_thread(self._write_meta, self._snapshot)
+                return False
+
+            snapshot = MetadataSnapshot(
+                data=data,
+                version=version,
+                etag=etag,
+                last_modified=last_modified,
+                fetched_at=time.time()
+            )
+            await asyncio.to_thread(self._persist, raw, snapshot)
+            self._snapshot = snapshot
+            logger.info(f"WMN metadata updated to version {version[:12]} ({len(data['sites'])} sites)")
+            return True
+
+    async def reload_from_disk(self) -> Optional[MetadataSnapshot]:
+        """Pick up a snapshot another process wrote; keeps the current one if the disk copy is unreadable"""
+        async with self._load_lock:
+            snapshot = await asyncio.to_thread(self._read_disk_snapshot)
+            if snapshot and (self._snapshot is None or snapshot.version != self._snapshot.version):
+                self._snapshot = snapshot
+                logger.info(f"Reloaded WMN metadata snapshot {snapshot.version[:12]} from {self.snapshot_path}")
+            return self._snapshot
+
+    async def _ensure_loaded(self, fetch_if_missing: bool) -> Optional[MetadataSnapshot]:
+        async with self._load_lock:
+            if self._snapshot is not None:
+                return self._snapshot
+
+            snapshot = await asyncio.to_thread(self._read_disk_snapshot)
+            if snapshot:
+                self._snapshot = snapshot
+                logger.info(f"Loaded WMN metadata snapshot {snapshot.version[:12]} from {self.snapshot_path}")
+                return snapshot
+
+            if not fetch_if_missing:
+                return None
+
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to fetch metadata: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to fetch metadata: {str(e)}")
+            return self._snapshot
+
+    def _schedule_refresh(self):
+        if self._refresh_lock.locked():
+            return
+        if self._pending_refresh and not self._pending_refresh.done():
+            return
+        if time.time() < self._retry_after:
+            return
+        self._pending_refresh = asyncio.create_task(self._safe_refresh())
+
+    async def _safe_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            self._retry_after = time.time() + self.retry_backoff
+            logger.warning(f"WMN metadata refresh failed, keeping current snapshot: {e}")
+
+    async def _refresh_loop(self):
+        while True:
+            snapshot = self._snapshot
+            if snapshot is None:
+                delay = 0
+            else:
+                age = time.time() - snapshot.fetched_at
+                delay = max(0.0, self.refresh_interval - age)
+            await asyncio.sleep(delay)
+            await self._safe_refresh()
+            if time.time() < self._retry_after:
+                # Upstream unreachable; back off before the next attempt
+                await asyncio.sleep(self.retry_backoff)
+
+    # ── disk helpers (run in a worker thread) ───────────────────
+
+    def _read_disk_snapshot(self) -> Optional[MetadataSnapshot]:
+        if not self.snapshot_path.exists():
+            return None
+        try:
+            raw = self.snapshot_path.read_bytes()
+            data = json.loads(raw)
+            meta = {}
+            if self.meta_path.exists():
+                meta = json.loads(self.meta_path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable WMN snapshot {self.snapshot_path}: {e}")
+            return None
+
+        return MetadataSnapshot(
+            data=data,
+            version=meta.get("version") or hashlib.sha1(raw).hexdigest(),
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+            fetched_at=float(meta.get("fetched_at") or 0.0)
+        )
+
+    def _persist(self, raw: bytes, snapshot: MetadataSnapshot):
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        self._atomic_write(self.snapshot_path, raw)
+        self._write_meta(snapshot)
+
+    def _write_meta(self, snapshot: MetadataSnapshot):
+        self.meta_path.parent.mkdir(parents=True, exist_ok=True)
+        self._atomic_write(self.meta_path, json.dumps(snapshot.to_meta()).encode())
+
+    @staticmethod
+    def _atomic_write(path: Path, payload: bytes):
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,215 @@
+import json
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote
+
+from services.wmn_matcher import SiteMatcher
+
+PLACEHOLDER = "{account}"
+
+
+class RequestMethod(Enum):
+    """How a site check is sent"""
+    GET = "GET"
+    POST_JSON = "POST_JSON"
+    POST_FORM = "POST_FORM"
+    POST_RAW = "POST_RAW"
+
+
+@lru_cache(maxsize=1024)
+def quote_account(username: str) -> str:
+    """URL-quoted username, computed once per search instead of once per site"""
+    return quote(username)
+
+
+def _render(value: Any, username: str) -> Any:
+    """Substitute the username into a pre-parsed JSON body template"""
+    if isinstance(value, str):
+        return value.replace(PLACEHOLDER, username) if PLACEHOLDER in value else value
+    if isinstance(value, dict):
+        return {_render(k, username): _render(v, username) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_render(item, username) for item in value]
+    return value
+
+
+class SiteCheckPlan:
+    """Everything needed to check one WMN site, derived once per metadata version."""
+    __slots__ = (
+        "site", "name", "category",
+        "check_parts", "pretty_parts",
+        "headers", "sets_user_agent",
+        "method", "body_template", "form_template", "raw_body_parts",
+        "e_code", "has_m_code", "m_code", "matcher",
+        "needs_confirmation", "numeric_only",
+    )
+
+    def __init__(self, site: dict, base_headers: Dict[str, str], confirmation_sites: Iterable[str] = ()):
+        self.site = site
+        self.name = site["name"]
+        self.category = site.get("cat", "unknown")
+
+        uri_check = site["uri_check"]
+        self.check_parts: Tuple[str, ...] = tuple(uri_check.split(PLACEHOLDER))
+        self.pretty_parts: Tuple[str, ...] = tuple(site.get("uri_pretty", uri_check).split(PLACEHOLDER))
+
+        headers = dict(base_headers)
+        site_headers = site.get("headers") or {}
+        headers.update(site_headers)
+        self.headers = headers
+        self.sets_user_agent = "User-Agent" in site_headers
+
+        self.body_template = None
+        self.form_template: Optional[List[Tuple[str, str]]] = None
+        self.raw_body_parts: Optional[Tuple[str, ...]] = None
+
+        post_body = site.get("post_body")
+        if not post_body:
+            self.method = RequestMethod.GET
+        else:
+            content_type = headers.get("Content-Type", "").lower()
+            if "json" in content_type:
+                self.method = RequestMethod.POST_JSON
+                try:
+                    self.body_template = json.loads(post_body)
+                except json.JSONDecodeError:
+                    # Placeholder is not a valid JSON token on its own; substitute textually
+                    self.raw_body_parts = tuple(post_body.split(PLACEHOLDER))
+            elif "form-urlencoded" in content_type:
+                self.method = RequestMethod.POST_FORM
+                self.form_template = parse_qsl(post_body)
+            else:
+                self.method = RequestMethod.POST_RAW
+                self.raw_body_parts = tuple(post_body.split(PLACEHOLDER))
+
+        self.e_code = site.get("e_code")
+        self.has_m_code = "m_code" in site
+        self.m_code = site.get("m_code")
+        self.matcher = SiteMatcher(site.get("e_string"), site.get("m_string"))
+
+        self.needs_confirmation = self.name in confirmation_sites
+        self.numeric_only = self.name == "Mixi"
+
+    @property
+    def http_method(self) -> str:
+        return "GET" if self.method == RequestMethod.GET else "POST"
+
+    def check_url(self, quoted_username: str) -> str:
+        return quoted_username.join(self.check_parts)
+
+    def display_url(self, username: str) -> str:
+        return username.join(self.check_parts)
+
+    def pretty_url(self, username: str) -> str:
+        return username.join(self.pretty_parts)
+
+    def request_body(self, username: str) -> Dict[str, Any]:
+        """aiohttp keyword arguments carrying the POST body, empty for GET"""
+        method = self.method
+        if method == RequestMethod.GET:
+            return {}
+
+        if method == RequestMethod.POST_JSON:
+            if self.body_template is not None:
+                body = _render(self.body_template, username)
+            else:
+                try:
+                    body = json.loads(username.join(self.raw_body_parts))
+                except json.JSONDecodeError:
+                    return {}
+            return {"json": body} if isinstance(body, dict) else {}
+
+        if method == RequestMethod.POST_FORM:
+            data = {
+                key.replace(PLACEHOLDER, username): value.replace(PLACEHOLDER, username)
+                for key, value in self.form_template
+            }
+            return {"data": data} if data else {}
+
+        body = username.join(self.raw_body_parts)
+        return {"data": body} if body else {}
+
+
+def compile_site_plans(sites: List[dict],
+                       base_headers: Dict[str, str],
+                       confirmation_sites: Iterable[str] = ()) -> List[SiteCheckPlan]:
+    """Turn raw WMN site dicts into check plans, skipping malformed entries"""
+    confirmation_sites = frozenset(confirmation_sites)
+    plans = []
+    for site in sites:
+        if not site.get("name") or not site.get("uri_check"):
+            continue
+        plans.append(SiteCheckPlan(site, base_headers, confirmation_sites))
+    return plans
+
+
+class SiteIndex:
+    """
+    Lookup tables for one WMN metadata version, built once alongside the plans.
+
+    Category and name filters touch only the matching plans, and the
+    /metadata summary is precomputed. Counts are over the raw site list, so
+    malformed entries that have no plan are still counted as before.
+    """
+    __slots__ = ("version", "plans", "by_name", "by_category", "category_counts", "total_sites", "summary", "_position")
+
+    def __init__(self, version: Optional[str], sites: List[dict], plans: List[SiteCheckPlan]):
+        self.version = version
+        self.plans = plans
+        self.by_name: Dict[str, SiteCheckPlan] = {}
+        by_category: Dict[str, List[SiteCheckPlan]] = {}
+        for plan in plans:
+            self.by_name[plan.name] = plan
+            by_category.setdefault(plan.category, []).append(plan)
+        self.by_category: Dict[str, Tuple[SiteCheckPlan, ...]] = {
+            category: tuple(members) for category, members in by_category.items()
+        }
+        self._position = {id(plan): position for position, plan in enumerate(plans)}
+
+        counts: Dict[str, int] = {}
+        for site in sites:
+            category = site.get("cat", "unknown")
+            counts[category] = counts.get(category, 0) + 1
+        self.category_counts = counts
+        self.total_sites = len(sites)
+        self.summary = {
+            "version": version,
+            "total_sites": self.total_sites,
+            "categories": dict(counts),
+            "sites": [
+                {"name": site.get("name"), "category": site.get("cat"), "url": site.get("uri_check")}
+                for site in sites[:10]
+            ],
+        }
+
+    def select(self,
+               categories: Optional[Iterable[str]] = None,
+               names: Optional[Iterable[str]] = None) -> List[SiteCheckPlan]:
+        """Plans in the given categories and/or with the given names, in metadata order"""
+        if names is not None:
+            selected = [self.by_name[name] for name in dict.fromkeys(names) if name in self.by_name]
+            if categories:
+                wanted = set(categories)
+                selected = [plan for plan in selected if plan.category in wanted]
+        elif categories:
+            selected = [plan for category in dict.fromkeys(categories) for plan in self.by_category.get(category, ())]
+        else:
+            return list(self.plans)
+        selected.sort(key=lambda plan: self._position[id(plan)])
+        return selected
+
+    def category(self, category: str) -> List[dict]:
+        """Sites of one category as /metadata lists them"""
+        return [
+            {"name": plan.name, "category": plan.category, "url": plan.site.get("uri_check")}
+            for plan in self.by_category.get(category, ())
+        ]
+
+
+def build_site_index(version: Optional[str],
+                     sites: List[dict],
+                     base_headers: Dict[str, str],
+                     confirmation_sites: Iterable[str] = ()) -> SiteIndex:
+    """Compile plans and their index in one pass (run off the event loop)"""
+    return SiteIndex(version, sites, compile_site_plans(sites, base_headers, confirmation_sites))
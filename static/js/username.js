@@ -1,6 +1,9 @@
 class OSINTSearch {
     constructor() {
         this.eventSource = null;
+        this.searchId = null;
+        this.lastEventId = null;
+        this.resumeAttempts = 0;
         this.searchActive = false;
         this.results = [];
         this.resultsByCategory = {};
@@ -52,7 +55,7 @@ class OSINTSearch {
 
         if (this.elements.stopBtn) {
             this.elements.stopBtn.addEventListener('click', () => {
-                this.stopSearch();
+                this.stopSearch(true);
             });
         }
 
@@ -133,9 +136,19 @@ class OSINTSearch {
 
         const url = `/api/username/search/stream?username=${encodeURIComponent(username)}&include_duckduckgo=false&extract_profile=true`;
 
+        this.searchId = null;
+        this.lastEventId = null;
+        this.resumeAttempts = 0;
+        this.openStream(url);
+    }
+
+    openStream(url) {
         this.eventSource = new EventSource(url);
 
         this.eventSource.onmessage = (event) => {
+            if (event.lastEventId) {
+                this.lastEventId = event.lastEventId;
+            }
             try {
                 const data = JSON.parse(event.data);
                 this.handleEvent(data);
@@ -145,14 +158,34 @@ class OSINTSearch {
         };
 
         this.eventSource.onerror = (error) => {
+            // While CONNECTING the browser retries with Last-Event-ID and the
+            // server resumes the same job; only a closed stream needs handling
+            if (!this.eventSource || this.eventSource.readyState !== EventSource.CLOSED) {
+                return;
+            }
             console.error('EventSource error:', error);
+            if (this.searchActive && this.searchId && this.resumeAttempts < 3) {
+                this.resumeAttempts += 1;
+                this.eventSource.close();
+                this.openStream(this.resumeUrl());
+                return;
+            }
             this.stopSearch();
         };
     }
 
+    resumeUrl() {
+        const url = `/api/username/search/${encodeURIComponent(this.searchId)}/stream`;
+        if (!this.lastEventId) {
+            return url;
+        }
+        return `${url}?last_event_id=${this.lastEventId.split(':').pop()}`;
+    }
+
     handleEvent(event) {
         switch (event.event_type) {
             case 'search_started':
+                this.searchId = event.data.search_id;
                 this.stats.total = event.data.total_sites;
                 this.updateStats();
                 break;
@@ -177,6 +210,11 @@ class OSINTSearch {
             case 'search_completed':
                 this.handleSearchCompleted(event.data);
                 break;
+
+            case 'error':
+                console.error('Search failed:', event.data.message);
+                this.stopSearch();
+                break;
         }
     }
 
@@ -1306,12 +1344,18 @@ class OSINTSearch {
         this.stopSearch();
     }
 
-    stopSearch() {
+    stopSearch(cancel = false) {
         if (this.eventSource) {
             this.eventSource.close();
             this.eventSource = null;
         }
 
+        // Closing the stream leaves the server-side job running; Stop cancels it
+        if (cancel && this.searchId) {
+            fetch(`/api/username/search/${encodeURIComponent(this.searchId)}`, { method: 'DELETE' })
+                .catch(error => console.error('Failed to cancel search:', error));
+        }
+
         this.searchActive = false;
         this.elements.searchBtn.disabled = false;
         this.elements.searchBtn.innerHTML = '<i class="fas fa-search mr-2"></i>Search Username';
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from services.username_search_jobs import JobStatus, SearchJobManager, parse_event_id
+from services.username_service import EventType, StreamEvent
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeService:
+    """Emits one event per tick until released"""
+
+    def __init__(self, events: int = 3, tick: float = 0.01):
+        self.events = events
+        self.tick = tick
+        self.release = asyncio.Event()
+
+    async def stream_search_batches(self, username, search_id, **params):
+        yield [StreamEvent(EventType.SEARCH_STARTED, {"search_id": search_id, "username": username})]
+        for index in range(self.events):
+            await asyncio.sleep(self.tick)
+            yield [StreamEvent(EventType.SITE_RESULT, {"site_name": f"site{index}", "status": "found"})]
+        await self.release.wait()
+        yield [StreamEvent(EventType.SEARCH_COMPLETED, {"search_id": search_id, "total_found": self.events})]
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc-123:7") == ("abc-123", 7)
+    assert parse_event_id("7") == (None, 7)
+    with pytest.raises(ValueError):
+        parse_event_id("abc:")
+
+
+async def test_follow_resumes_after_last_event_id():
+    service = FakeService()
+    manager = SearchJobManager(service)
+    job = manager.create("alice")
+
+    seen = []
+    follower = manager.follow(job)
+    async for batch in follower:
+        seen.extend(event_id for event_id, _ in batch)
+        if len(seen) >= 2:
+            break
+    await follower.aclose()
+
+    service.release.set()
+    resumed = []
+    async for batch in manager.follow(manager.get(job.search_id), last_event_id=seen[-1]):
+        resumed.extend(event_id for event_id, _ in batch)
+
+    assert resumed[0] == seen[-1] + 1
+    assert resumed[-1] == len(job.events) - 1
+    assert job.status == JobStatus.COMPLETED
+    await manager.stop()
+
+
+async def test_unwatched_running_job_is_cancelled_after_grace():
+    service = FakeService()
+    manager = SearchJobManager(service, abandon_seconds=30, max_running=1)
+    job = manager.create("alice")
+    follower = manager.follow(job)
+    await follower.__anext__()
+    await follower.aclose()
+
+    manager.collect()
+    assert not job.done
+
+    job.last_watched_at = time.time() - 31
+    manager.collect()
+    await asyncio.gather(job.task, return_exceptions=True)
+
+    assert job.status == JobStatus.CANCELLED
+    assert manager.find(job.search_id) is job
+    # The slot is free again
+    manager.create("bob")
+    await manager.stop()
+
+
+async def test_watched_job_is_not_cancelled():
+    service = FakeService()
+    manager = SearchJobManager(service, abandon_seconds=0)
+    job = manager.create("alice")
+    follower = manager.follow(job)
+    await follower.__anext__()
+
+    manager.collect()
+    assert not job.done
+
+    await follower.aclose()
+    await manager.stop()